@@ -1,21 +1,90 @@
-import json
-from typing import List, Dict, Optional, Tuple
+import atexit
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import sys
-
-# Добавляем корневую директорию проекта в sys.path
-current_dir = Path(__file__).parent
-parent_dir = current_dir.parent
-if str(parent_dir) not in sys.path:
-    sys.path.insert(0, str(parent_dir))
+from typing import List, Dict, Optional, Tuple
 
-from langchain_chroma import Chroma
+import numpy as np
+import chromadb
 from langchain_openai import OpenAIEmbeddings
-from langchain.schema import Document
+from utils.console import say
 from utils.data_models import MemberProfile, sanitize_filename
+from utils.json_io import list_json_files, read_json, write_json
+from utils.query_cache import QueryCache
 import config
 
 
+def _load_profile(path: str) -> dict:
+    """Чтение и валидация профиля в дочернем процессе (функция модульного уровня, чтобы её можно было сериализовать)"""
+    return MemberProfile(**read_json(path)).model_dump()
+
+
+# Кэш векторов запросов общий для всех экземпляров агента и сохраняется между запусками:
+# эмбеддинг зависит только от текста, поэтому не сбрасывается при переиндексации
+_QUERY_EMB_CACHE_PATH = config.CACHE_DIR / "query_emb_cache.pkl"
+_query_emb_cache: Optional[QueryCache] = None
+_query_emb_cache_lock = threading.Lock()
+
+
+def _get_query_emb_cache() -> QueryCache:
+    """Общий кэш эмбеддингов запросов (при первом обращении читается с диска)"""
+    global _query_emb_cache
+    with _query_emb_cache_lock:
+        if _query_emb_cache is None:
+            cache = QueryCache(max_size=1024, ttl_seconds=None)
+            try:
+                with open(_QUERY_EMB_CACHE_PATH, "rb") as f:
+                    for query, vector in pickle.load(f):
+                        cache.put(query, vector)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Could not load query embedding cache: {e}", flush=True)
+            _query_emb_cache = cache
+            atexit.register(_save_query_emb_cache)
+        return _query_emb_cache
+
+
+def _save_query_emb_cache() -> None:
+    """Сохранение кэша эмбеддингов запросов при завершении процесса"""
+    if _query_emb_cache is None:
+        return
+    # Временный файл и атомарная подмена: убитый посреди записи процесс не оставит обрезанный кэш
+    tmp_path = _QUERY_EMB_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(_query_emb_cache.items(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, _QUERY_EMB_CACHE_PATH)
+    except Exception as e:
+        print(f"Could not save query embedding cache: {e}", flush=True)
+
+
+PROFESSIONAL_COLLECTION = "professional_profiles"
+PERSONAL_COLLECTION = "personal_profiles"
+COLLECTION_METADATA = {"hnsw:space": "cosine"}  # distance = 1 - cos, диапазон 0..2
+# Размер одного upsert в ChromaDB. Инкрементальные вставки тоже лучше группировать
+# в отсортированные по ID пачки примерно такого размера (512-2048)
+UPSERT_BATCH_SIZE = 1024
+# Строк int8 матрицы, переводимых во float32 за раз при скоринге: временный буфер
+# ограничен (~6 МБ при D=1536), а умножение идет через BLAS, как в float32 режиме
+INT8_BLOCK_ROWS = 1024
+
+
+def _to_l2_distance(distance: float, space: str) -> float:
+    """
+    Расстояние ChromaDB в шкале l2 - квадрат евклидова расстояния, 2 - 2cos для нормированных
+    эмбеддингов OpenAI. В этой шкале считаются все distance агента: так ранжировали профили
+    коллекции langchain-chroma (пространство l2 по умолчанию), similarity = 1 - distance / 2 = cos.
+    
+    Коллекции, созданные агентом, используют cosine (distance = 1 - cos), созданные раньше - l2;
+    get_or_create_collection пространство существующей коллекции не меняет.
+    """
+    # cosine: 1 - cos, ip: 1 - <a, b> (то же самое для нормированных векторов)
+    return distance if space == "l2" else 2.0 * distance
+
+
 class EmbeddingAgent:
     """Агент для работы с эмбеддингами профилей через ChromaDB"""
     
@@ -29,195 +98,385 @@ class EmbeddingAgent:
         # Путь к ChromaDB
         self.persist_directory = str(config.DATA_DIR / "chroma_db")
         
-        # Инициализация двух коллекций
-        self.professional_db = Chroma(
-            collection_name="professional_profiles",
-            embedding_function=self.embeddings,
-            persist_directory=f"{self.persist_directory}/professional"
+        # Инициализация двух коллекций (нативный клиент ChromaDB, эмбеддинги считаем сами)
+        self.professional_client = chromadb.PersistentClient(path=f"{self.persist_directory}/professional")
+        self.personal_client = chromadb.PersistentClient(path=f"{self.persist_directory}/personal")
+        
+        self.professional_collection = self.professional_client.get_or_create_collection(
+            name=PROFESSIONAL_COLLECTION,
+            metadata=COLLECTION_METADATA
+        )
+        self.personal_collection = self.personal_client.get_or_create_collection(
+            name=PERSONAL_COLLECTION,
+            metadata=COLLECTION_METADATA
         )
         
-        self.personal_db = Chroma(
-            collection_name="personal_profiles",
-            embedding_function=self.embeddings,
-            persist_directory=f"{self.persist_directory}/personal"
+        # Матрица нормированных эмбеддингов коллекции для точного скоринга всего корпуса:
+        # search_type -> (штамп индекса, имена, матрица N x D, масштабы строк); загружается лениво
+        # и перечитывается, если индекс на диске изменил другой процесс (например, extract при работающем боте).
+        # При EMBEDDING_INT8 матрица хранится в int8 с масштабом на строку, иначе float32 и масштабов нет
+        self._corpus: Dict[str, Tuple[int, List[str], np.ndarray, Optional[np.ndarray]]] = {}
+        
+        # Кэш результатов search_similar (сбрасывается при изменении индексов)
+        self._qcache = QueryCache()
+        # Кэш векторов запросов (общий для всех агентов процесса, переживает перезапуск)
+        self._emb_cache = _get_query_emb_cache()
+        # Запись в коллекции из параллельных потоков (extract) - по одной; эмбеддинги считаются вне блокировки
+        self._write_lock = threading.Lock()
+    
+    def _invalidate_caches(self) -> None:
+        """Сброс кэшей, зависящих от содержимого индексов (после индексации или очистки)"""
+        self._corpus = {}
+        self._qcache.clear()
+    
+    def _get_collection(self, search_type: str):
+        """Коллекция для выбранного типа поиска"""
+        return self.professional_collection if search_type == "professional" else self.personal_collection
+    
+    def _top_k(self, query: str, search_type: str, k: int) -> List[Tuple[str, float]]:
+        """k ближайших профилей: список (имя_профиля, distance) по возрастанию distance (шкала l2: 2 - 2cos)"""
+        names, cosine = self._cosine_all(query, search_type)
+        if k < len(names):
+            # argpartition - O(N) отбор k лучших, сортируем только их
+            idx = np.argpartition(-cosine, k)[:k]
+        else:
+            idx = np.arange(len(names))
+        idx = idx[np.argsort(-cosine[idx], kind="stable")]
+        return [(names[i], 2.0 - 2.0 * score) for i, score in zip(idx.tolist(), cosine[idx].tolist())]
+    
+    def _query_hnsw(self, query: str, search_type: str, k: int) -> List[Tuple[str, float]]:
+        """k ближайших через HNSW индекс ChromaDB (приближенно, без загрузки матрицы корпуса); distance в шкале l2"""
+        collection = self._get_collection(search_type)
+        # Пространство берем из метаданных самой коллекции: старые коллекции созданы в l2
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        result = collection.query(
+            query_embeddings=[self._embed(query)],
+            n_results=k,
+            include=["metadatas", "distances"]
         )
+        metadatas = result["metadatas"][0]
+        distances = result["distances"][0]
+        return [
+            (meta["name"], _to_l2_distance(distance, space))
+            for meta, distance in zip(metadatas, distances) if meta and meta.get("name")
+        ]
     
-    def _create_professional_text(self, profile: MemberProfile) -> str:
-        """Создание текста для профессионального эмбеддинга"""
-        parts = []
+    @staticmethod
+    def _quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Симметричное int8 квантование по строкам: matrix ~= q * scales[:, None] / 127"""
+        scales = np.abs(matrix).max(axis=-1, keepdims=True)
+        scales[scales == 0] = 1.0
+        q = np.round(matrix / scales * 127).astype(np.int8)
+        return q, scales.ravel().astype(np.float32)
+    
+    def _index_stamp(self, search_type: str) -> int:
+        """Последнее изменение файлов ChromaDB коллекции (штамп для снимка матрицы на диске)"""
+        client_dir = Path(self.persist_directory) / search_type
+        return max((f.stat().st_mtime_ns for f in client_dir.rglob("*") if f.is_file()), default=0)
+    
+    def _load_corpus(self, search_type: str, stamp: int) -> Tuple[List[str], np.ndarray]:
+        """
+        Имена и L2-нормированная float32 матрица эмбеддингов коллекции
         
-        # Имя всегда добавляем
-        parts.append(f"Имя: {profile.name}")
+        Матрица сохраняется в CACHE_DIR/corpus_<тип>.npz со штампом индекса - при
+        старте процесса она читается одним файлом, без выгрузки всей коллекции из ChromaDB.
+        """
+        snapshot_path = config.CACHE_DIR / f"corpus_{search_type}.npz"
+        try:
+            with np.load(snapshot_path) as snapshot:
+                if int(snapshot["stamp"]) == stamp:
+                    return snapshot["names"].tolist(), snapshot["matrix"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Could not read corpus snapshot: {e}", flush=True)
         
-        # Бизнес - самое важное для профессионального поиска
-        if profile.business:
-            parts.append(f"Бизнес и деятельность: {profile.business}")
+        data = self._get_collection(search_type).get(include=["embeddings", "metadatas"])
+        names, rows = [], []
+        for meta, embedding in zip(data["metadatas"], data["embeddings"]):
+            if meta and meta.get("name"):
+                names.append(meta["name"])
+                rows.append(embedding)
         
-        # Экспертиза тоже важна
-        if profile.expertise:
-            parts.append(f"Экспертиза и навыки: {profile.expertise}")
+        matrix = np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms > 0, norms, 1.0)
+        
+        try:
+            with open(snapshot_path, "wb") as f:
+                np.savez(f, stamp=np.int64(stamp), names=np.asarray(names, dtype=str), matrix=matrix)
+        except Exception as e:
+            print(f"Could not write corpus snapshot: {e}", flush=True)
+        return names, matrix
+    
+    def _corpus_matrix(self, search_type: str) -> Tuple[List[str], np.ndarray, Optional[np.ndarray]]:
+        """Имена, L2-нормированная матрица эмбеддингов коллекции и масштабы int8 (кэшируется до изменения индекса)"""
+        stamp = self._index_stamp(search_type)
+        corpus = self._corpus.get(search_type)
+        if corpus is None or corpus[0] != stamp:
+            if corpus is not None:
+                # Индекс переписан извне - кэшированные результаты поиска тоже устарели
+                self._qcache.clear()
+            names, matrix = self._load_corpus(search_type, stamp)
+            
+            scales = None
+            if config.EMBEDDING_INT8 and names:
+                # В 4 раза меньше памяти; точность косинуса ~1e-3, порядок ранжирования практически не меняется
+                matrix, scales = self._quantize_int8(matrix)
+            
+            corpus = (stamp, names, matrix, scales)
+            self._corpus[search_type] = corpus
+        return corpus[1:]
+    
+    def preload_corpus(self) -> None:
+        """Загрузка матриц обеих коллекций заранее (при старте бота), чтобы первый запрос не ждал"""
+        for search_type in ("professional", "personal"):
+            self._corpus_matrix(search_type)
+    
+    def _cosine_all(self, query: str, search_type: str) -> Tuple[List[str], np.ndarray]:
+        """Косинусная близость запроса ко ВСЕМ профилям коллекции одним матрично-векторным умножением"""
+        names, matrix, scales = self._corpus_matrix(search_type)
+        if not names:
+            return names, np.empty(0, dtype=np.float32)
+        
+        query_vec = self.query_vector(query)
+        
+        if scales is None:
+            return names, matrix @ query_vec
+        
+        # int8 хранится в памяти, а умножается блоками во float32 - без копии всей матрицы
+        scores = np.empty(len(names), dtype=np.float32)
+        for start in range(0, len(names), INT8_BLOCK_ROWS):
+            end = start + INT8_BLOCK_ROWS
+            scores[start:end] = matrix[start:end].astype(np.float32) @ query_vec
+        scores *= scales / 127.0
+        return names, scores
+    
+    def query_vector(self, query: str) -> np.ndarray:
+        """L2-нормированный эмбеддинг запроса (float32), скалярное произведение таких векторов = косинус"""
+        query_vec = np.asarray(self._embed(query), dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm > 0:
+            query_vec /= norm
+        return query_vec
+    
+    def _embed(self, query: str) -> List[float]:
+        """Эмбеддинг запроса с кэшированием (один HTTP-запрос к OpenAI на уникальный текст)"""
+        vector = self._emb_cache.get(query)
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+            self._emb_cache.put(query, vector)
+        return vector
+    
+    def _create_professional_text(self, profile: MemberProfile) -> str:
+        """Создание текста для профессионального эмбеддинга"""
+        # Бизнес - самое важное для профессионального поиска, экспертиза тоже важна
+        business = f" Бизнес и деятельность: {profile.business}" if profile.business else ""
+        expertise = f" Экспертиза и навыки: {profile.expertise}" if profile.expertise else ""
         
-        # Контакты меньше влияют на семантический поиск
-        if profile.contacts and len(profile.contacts) > 0:
-            # Берем только названия компаний/сайтов из контактов
-            company_contacts = [c for c in profile.contacts if not c.startswith('+') and '@' not in c]
-            if company_contacts:
-                parts.append(f"Связанные компании: {', '.join(company_contacts)}")
+        # Контакты меньше влияют на семантический поиск - берем только названия компаний/сайтов
+        company_contacts = [c for c in (profile.contacts or ()) if not c.startswith('+') and '@' not in c]
+        companies = f" Связанные компании: {', '.join(company_contacts)}" if company_contacts else ""
         
-        return " ".join(parts)
+        return f"Имя: {profile.name}{business}{expertise}{companies}"
     
     def _create_personal_text(self, profile: MemberProfile) -> str:
         """Создание текста для личного эмбеддинга"""
-        parts = [profile.name]
-        
-        if profile.hobbies:
-            parts.extend(profile.hobbies)
-        
-        if profile.family_status:
-            parts.append(profile.family_status)
-        
-        return " ".join(parts)
+        hobbies = f" {' '.join(profile.hobbies)}" if profile.hobbies else ""
+        family_status = f" {profile.family_status}" if profile.family_status else ""
+        return f"{profile.name}{hobbies}{family_status}"
     
     def index_profile(self, profile: MemberProfile) -> None:
         """Индексация одного профиля в обе коллекции"""
-        # Создаем тексты для эмбеддингов
-        professional_text = self._create_professional_text(profile)
-        personal_text = self._create_personal_text(profile)
+        self.batch_index_profiles([profile])
+        say(f"Indexed profile: {profile.name}")
+    
+    def batch_index_profiles(self, profiles: List[MemberProfile]) -> int:
+        """
+        Пакетная индексация профилей в обе коллекции
         
-        # Создаем уникальный ID на основе имени (для предотвращения дубликатов)
-        profile_id = sanitize_filename(profile.name, max_length=100)
+        Вместо двух HTTP-запросов к OpenAI на каждый профиль делаем по одному
+        embed_documents на коллекцию (клиент сам режет вход на допустимые пачки)
+        и upsert в ChromaDB пачками по UPSERT_BATCH_SIZE. Профили предварительно
+        сортируются по ID - SQLite/HNSW хранилище Chroma получает монотонный поток
+        ключей и меньше перестраивает страницы индекса.
         
-        # Метаданные профиля
-        metadata = {
-            "name": profile.name,
-            "source": profile.source_image or "unknown"
-        }
+        Args:
+            profiles: Список профилей для индексации
+            
+        Returns:
+            Количество проиндексированных профилей
+        """
+        if not profiles:
+            return 0
         
-        # Создаем документы с явным ID
-        professional_doc = Document(
-            page_content=professional_text,
-            metadata={**metadata, "type": "professional"}
-        )
+        prof_texts, pers_texts = [], []
+        prof_ids, pers_ids = [], []
+        prof_metas, pers_metas = [], []
         
-        personal_doc = Document(
-            page_content=personal_text,
-            metadata={**metadata, "type": "personal"}
+        keyed = sorted(
+            ((sanitize_filename(profile.name, max_length=100), profile) for profile in profiles),
+            key=lambda item: item[0]
         )
         
-        # Используем upsert через add_documents с ID для предотвращения дубликатов
-        # ChromaDB автоматически заменит документ с тем же ID
-        self.professional_db.add_documents([professional_doc], ids=[f"prof_{profile_id}"])
-        self.personal_db.add_documents([personal_doc], ids=[f"pers_{profile_id}"])
-        
-        print(f"Indexed profile: {profile.name}", flush=True)
+        for profile_id, profile in keyed:
+            metadata = {
+                "name": profile.name,
+                "source": profile.source_image or "unknown"
+            }
+            
+            prof_texts.append(self._create_professional_text(profile))
+            prof_ids.append(f"prof_{profile_id}")
+            prof_metas.append({**metadata, "type": "professional"})
+            
+            pers_texts.append(self._create_personal_text(profile))
+            pers_ids.append(f"pers_{profile_id}")
+            pers_metas.append({**metadata, "type": "personal"})
+        
+        prof_vectors = self.embeddings.embed_documents(prof_texts)
+        pers_vectors = self.embeddings.embed_documents(pers_texts)
+        
+        with self._write_lock:
+            for start in range(0, len(keyed), UPSERT_BATCH_SIZE):
+                end = start + UPSERT_BATCH_SIZE
+                self.professional_collection.upsert(
+                    ids=prof_ids[start:end],
+                    embeddings=prof_vectors[start:end],
+                    documents=prof_texts[start:end],
+                    metadatas=prof_metas[start:end]
+                )
+                self.personal_collection.upsert(
+                    ids=pers_ids[start:end],
+                    embeddings=pers_vectors[start:end],
+                    documents=pers_texts[start:end],
+                    metadatas=pers_metas[start:end]
+                )
+            self._invalidate_caches()
+        
+        return len(profiles)
     
     def batch_index_all_profiles(self) -> int:
         """Индексация всех профилей из директории"""
-        json_files = list(config.PROFILES_DIR.glob("*.json"))
-        indexed_count = 0
-        self._profile_count = len(json_files)  # Сохраняем для оптимизации поиска
+        json_files = list_json_files(config.PROFILES_DIR)
         
         print(f"Found {len(json_files)} profiles to index", flush=True)
         
-        for json_file in json_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    profile_data = json.load(f)
-                    profile = MemberProfile(**profile_data)
-                    self.index_profile(profile)
-                    indexed_count += 1
-            except Exception as e:
-                print(f"Error indexing {json_file}: {str(e)}", flush=True)
+        # Чтение и валидация JSON - CPU-bound, распределяем по ядрам
+        profiles = []
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [(json_file, executor.submit(_load_profile, json_file.path)) for json_file in json_files]
+            for json_file, future in futures:
+                try:
+                    # Данные уже провалидированы в воркере
+                    profiles.append(MemberProfile.model_construct(**future.result()))
+                except Exception as e:
+                    print(f"Error indexing {json_file.path}: {str(e)}", flush=True)
         
         # В новой версии ChromaDB изменения сохраняются автоматически
+        indexed_count = self.batch_index_profiles(profiles)
         
         print(f"Successfully indexed {indexed_count} profiles", flush=True)
         return indexed_count
     
-    def search_similar(self, query: str, search_type: str = "professional", k: int = 30, save_all_scores: bool = True) -> List[Tuple[str, float]]:
+    def search_similar(self, query: str, search_type: str = "professional", k: int = 30, save_all_scores: bool = False) -> List[Tuple[str, float]]:
         """
         Поиск похожих профилей
         
         Args:
             query: Текст запроса
             search_type: "professional" или "personal"
-            k: Количество результатов (используется только когда return_all=False)
-            save_all_scores: Сохранять ли все scores в файл
+            k: Количество результатов
+            save_all_scores: Дополнительно сохранить scores всего корпуса в файл (см. dump_all_scores)
             
         Returns:
             Список кортежей (имя_профиля, score)
         """
-        # Выбираем базу
-        db = self.professional_db if search_type == "professional" else self.personal_db
-        
-        # Получаем профили с их scores
         if save_all_scores:
-            # Получаем все профили для полной картины
-            # Используем большое число, чтобы получить все профили из базы
-            max_results = self._profile_count if hasattr(self, '_profile_count') else 1000
-            all_results = db.similarity_search_with_score(query, k=max_results)
+            self.dump_all_scores(query, search_type)
+        
+        # Повторные запросы отдаем из кэша без обращения к OpenAI и ChromaDB.
+        # Ключ - исходный текст: эмбеддинг считается именно от него (см. _embed), поэтому
+        # запрос в другом регистре не должен получить чужой результат
+        cache_key = (query, search_type, k)
+        cached = self._qcache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Точный скоринг корпуса одним matmul и отбор k ближайших через argpartition
+        profile_scores = self._top_k(query, search_type, k)
+        
+        self._qcache.put(cache_key, profile_scores)
+        return profile_scores
+    
+    def search_nearest(self, query: str, search_type: str = "professional", k: int = 30, index: str = "flat") -> List[Tuple[str, float]]:
+        """
+        k ближайших профилей с similarity (косинус, отрицательный обрезается до 0) по убыванию
+        
+        Оба индекса дают одинаковую similarity для одной и той же пары запрос-профиль.
+        
+        Args:
+            query: Текст запроса
+            search_type: "professional" или "personal"
+            k: Количество результатов
+            index: "flat" - точный скоринг всей матрицы корпуса, "hnsw" - ANN запрос к индексу ChromaDB
+            
+        Returns:
+            Список кортежей (имя_профиля, similarity_score)
+        """
+        if index == "hnsw":
+            pairs = self._query_hnsw(query, search_type, k)
         else:
-            all_results = db.similarity_search_with_score(query, k=k)
-        
-        # Извлекаем имена и scores
-        all_profile_scores = []
-        profile_scores = []
-        seen_names = set()
-        
-        for doc, score in all_results:
-            name = doc.metadata.get("name")
-            if name and name not in seen_names:
-                all_profile_scores.append((name, score))
-                if len(profile_scores) < k:
-                    profile_scores.append((name, score))
-                seen_names.add(name)
-        
-        # Сохраняем все scores в файл
-        if save_all_scores and all_profile_scores:
+            pairs = self._top_k(query, search_type, k)
+        return [(name, max(0.0, 1.0 - distance / 2)) for name, distance in pairs]
+    
+    def dump_all_scores(self, query: str, search_type: str = "professional") -> List[Tuple[str, float]]:
+        """
+        Сохранение distance до запроса для ВСЕХ профилей коллекции (для отладки ранжирования)
+        
+        Args:
+            query: Текст запроса
+            search_type: "professional" или "personal"
+            
+        Returns:
+            Список кортежей (имя_профиля, distance)
+        """
+        names, cosine = self._cosine_all(query, search_type)
+        # Шкала l2, как в дампах langchain-chroma: distance = 2 - 2cos
+        all_profile_scores = list(zip(names, (2.0 - 2.0 * cosine).tolist()))
+        
+        if all_profile_scores:
             self._save_embedding_scores(query, search_type, all_profile_scores)
         
-        return profile_scores
+        return all_profile_scores
     
-    def get_all_profiles_with_scores(self, query: str, search_type: str = "professional", save_scores: bool = True) -> List[Tuple[str, float]]:
+    def get_all_profiles_with_scores(self, query: str, search_type: str = "professional", save_scores: bool = False) -> List[Tuple[str, float]]:
         """
         Получить ВСЕ профили с их косинусными scores
         
         Args:
             query: Текст запроса
             search_type: "professional" или "personal"
-            save_scores: Сохранять ли scores в файл для анализа
+            save_scores: Сохранять ли scores в файл для анализа (по умолчанию нет, см. SAVE_EMBEDDING_SCORES)
             
         Returns:
             Список ВСЕХ профилей (имя_профиля, similarity_score от 0 до 1)
         """
-        # Выбираем базу
-        db = self.professional_db if search_type == "professional" else self.personal_db
-        
-        # Получаем ВСЕ профили из базы
-        max_results = self._profile_count if hasattr(self, '_profile_count') else 1000
-        all_results = db.similarity_search_with_score(query, k=max_results)
-        
-        # Извлекаем имена и конвертируем scores
-        all_profile_scores = []
-        all_profile_scores_raw = []  # Для сохранения с оригинальными distance
-        seen_names = set()
-        
-        for doc, distance in all_results:
-            name = doc.metadata.get("name")
-            if name and name not in seen_names:
-                # Конвертируем distance в similarity (0 to 1)
-                # ChromaDB возвращает косинусное расстояние (0 = identical, 2 = opposite)
-                similarity = max(0, 1 - (distance / 2))
-                all_profile_scores.append((name, similarity))
-                all_profile_scores_raw.append((name, distance))  # Сохраняем оригинальное distance
-                seen_names.add(name)
+        # Точный скоринг ВСЕХ профилей: один matmul по нормированной матрице корпуса
+        # вместо выдачи всей коллекции через HNSW
+        names, cosine = self._cosine_all(query, search_type)
+        
+        # Конвертируем в similarity (0 to 1) так же, как раньше из distance ChromaDB (пространство l2):
+        # distance = 2 - 2cos (0 = identical), similarity = 1 - distance / 2 = cos
+        distances = 2.0 - 2.0 * cosine
+        similarity = np.maximum(0.0, 1.0 - distances / 2)
         
         # Сортируем по убыванию similarity
-        all_profile_scores.sort(key=lambda x: x[1], reverse=True)
+        order = np.argsort(-similarity, kind="stable")
+        all_profile_scores = [(names[i], score) for i, score in zip(order.tolist(), similarity[order].tolist())]
         
         # Сохраняем scores в файл если нужно
-        if save_scores and all_profile_scores_raw:
-            self._save_embedding_scores(query, search_type, all_profile_scores_raw)
+        if save_scores and names:
+            self._save_embedding_scores(query, search_type, list(zip(names, distances.tolist())))
         
         return all_profile_scores
     
@@ -233,86 +492,59 @@ class EmbeddingAgent:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_query = sanitize_filename(query, max_length=50)
         filename = f"scores_{search_type}_{safe_query}_{timestamp}.json"
+        if config.COMPRESS_EMBEDDING_SCORES:
+            filename += ".gz"
         
         filepath = scores_dir / filename
         
         # Сортируем по score (меньше = лучше для cosine distance)
-        sorted_scores = sorted(scores, key=lambda x: x[1])
+        names = [name for name, _ in scores]
+        distances = np.fromiter((score for _, score in scores), dtype=np.float64, count=len(scores))
+        order = np.argsort(distances, kind="stable")
+        sorted_distances = distances[order]
+        
+        # Конвертируем distance (0-2) в similarity % одной векторной операцией
+        similarity_percent = np.clip((1.0 - sorted_distances / 2) * 100.0, 0.0, None)
         
         # Готовим данные для сохранения
         data = {
             "query": query,
             "search_type": search_type,
             "timestamp": timestamp,
-            "total_profiles": len(sorted_scores),
+            "total_profiles": len(scores),
             "scores": [
                 {
-                    "rank": i + 1,
-                    "name": name,
-                    "score": float(score),
-                    "similarity_percent": max(0, (1 - float(score)/2) * 100)  # Конвертируем distance (0-2) в similarity %
+                    "rank": rank,
+                    "name": names[idx],
+                    "score": score,
+                    "similarity_percent": percent
                 }
-                for i, (name, score) in enumerate(sorted_scores)
+                for rank, (idx, score, percent) in enumerate(
+                    zip(order.tolist(), sorted_distances.tolist(), similarity_percent.tolist()), 1
+                )
             ]
         }
         
-        # Сохраняем
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Сохраняем (архивные .gz дампы пишем компактно, без отступов)
+        write_json(filepath, data, indent=not config.COMPRESS_EMBEDDING_SCORES)
         
         print(f"Saved all embedding scores to: {filepath}", flush=True)
     
     def clear_all_indexes(self) -> None:
         """Очистка всех индексов (для отладки)"""
-        # Используем альтернативный подход - очищаем коллекции без удаления директорий
+        # Пересоздаем коллекции целиком - не нужно выгружать и удалять документы по ID
+        self.professional_collection = self._reset_collection(self.professional_client, PROFESSIONAL_COLLECTION)
+        self.personal_collection = self._reset_collection(self.personal_client, PERSONAL_COLLECTION)
         
+        self._invalidate_caches()
+        print("All indexes cleared", flush=True)
+    
+    @staticmethod
+    def _reset_collection(client, name: str):
+        """Удаление коллекции и создание пустой с теми же настройками"""
         try:
-            # Получаем все ID документов и удаляем их
-            # Для professional_db
-            try:
-                prof_ids = self.professional_db.get()["ids"]
-                if prof_ids:
-                    self.professional_db.delete(ids=prof_ids)
-                    print(f"Deleted {len(prof_ids)} documents from professional index", flush=True)
-            except Exception as e:
-                print(f"Note: Could not clear professional index: {e}", flush=True)
-            
-            # Для personal_db
-            try:
-                pers_ids = self.personal_db.get()["ids"]
-                if pers_ids:
-                    self.personal_db.delete(ids=pers_ids)
-                    print(f"Deleted {len(pers_ids)} documents from personal index", flush=True)
-            except Exception as e:
-                print(f"Note: Could not clear personal index: {e}", flush=True)
-                
+            client.delete_collection(name)
         except Exception as e:
-            print(f"Warning during index clearing: {e}", flush=True)
-            # Если что-то пошло не так, пробуем пересоздать с нуля
-            import shutil
-            import os
-            
-            # Удаляем всю директорию ChromaDB как fallback
-            if os.path.exists(self.persist_directory):
-                try:
-                    shutil.rmtree(self.persist_directory)
-                except Exception as rm_error:
-                    print(f"Could not remove directory: {rm_error}", flush=True)
-            
-            # Пересоздаем базы
-            professional_dir = f"{self.persist_directory}/professional"
-            personal_dir = f"{self.persist_directory}/personal"
-            
-            self.professional_db = Chroma(
-                collection_name="professional_profiles",
-                embedding_function=self.embeddings,
-                persist_directory=professional_dir
-            )
-            
-            self.personal_db = Chroma(
-                collection_name="personal_profiles",
-                embedding_function=self.embeddings,
-                persist_directory=personal_dir
-            )
-        
-        print("All indexes cleared", flush=True)
\ No newline at end of file
+            # Коллекции может не быть (например, после ручной очистки директории)
+            print(f"Note: Could not delete collection {name}: {e}", flush=True)
+        return client.create_collection(name=name, metadata=COLLECTION_METADATA)
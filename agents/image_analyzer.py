@@ -1,24 +1,189 @@
+import asyncio
+import atexit
 import base64
-import json
+import mmap
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import quote
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from utils.data_models import MemberProfile, WorkflowState, sanitize_filename
+from utils.console import say
+from utils.extraction_cache import ExtractionCache, hash_image
+from utils.json_io import list_json_files, read_json, write_json
+from utils.profile_loader import ProfileLoader
 import config
 
 
+def _encode_file(path: str) -> str:
+    """
+    Base64-кодирование файла
+    
+    Результат не кэшируется: в прогоне extract каждое изображение кодируется один раз,
+    а кэш строк base64 (мегабайты на фото) только удерживал бы память.
+    """
+    with open(path, "rb") as image_file:
+        try:
+            # mmap отдает страницы файла напрямую в b64encode, без промежуточной копии в bytes
+            with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return base64.b64encode(mapped).decode('ascii')
+        except ValueError:
+            # Пустой файл нельзя отобразить в память
+            return base64.b64encode(image_file.read()).decode('ascii')
+
+
+class _SourceIndex:
+    """
+    Персистентный индекс source_image (в нижнем регистре) -> имя JSON файла профиля
+    
+    Хранится в DATA_DIR/source_index.json. При первом обращении сверяется с PROFILES_DIR:
+    записи удаленных профилей убираются, профили, созданные вне пайплайна, добавляются.
+    Изменения копятся в памяти и пишутся на диск атомарно одним flush - в конце прогона
+    (и при завершении процесса), а не на каждое сохранение профиля.
+    """
+    
+    def __init__(self, path: Path = config.DATA_DIR / "source_index.json"):
+        self.path = path
+        self._data: Optional[Dict[str, str]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+    
+    def _load(self) -> Dict[str, str]:
+        if self._data is None:
+            try:
+                self._data = read_json(self.path)
+            except (FileNotFoundError, ValueError):
+                self._data = {}
+            self._sync_with_profiles()
+        return self._data
+    
+    def _sync_with_profiles(self) -> None:
+        """Сверка с PROFILES_DIR одним проходом scandir; читаются только профили, которых нет в индексе"""
+        data = self._data
+        files = {entry.name: entry for entry in list_json_files(config.PROFILES_DIR)}
+        
+        stale = [image for image, filename in data.items() if filename not in files]
+        for image in stale:
+            del data[image]
+        
+        known = set(data.values())
+        added = 0
+        for filename, entry in files.items():
+            if filename in known:
+                continue
+            try:
+                source_image = read_json(entry.path).get('source_image')
+            except Exception:
+                continue
+            if source_image:
+                data[source_image.lower()] = filename
+                added += 1
+        
+        if stale or added:
+            self._dirty = True
+    
+    def get(self, image_name: str) -> Optional[Path]:
+        """Путь к JSON профиля для изображения или None"""
+        with self._lock:
+            filename = self._load().get(image_name.lower())
+        return config.PROFILES_DIR / filename if filename else None
+    
+    def set(self, image_name: str, profile_path: Path) -> None:
+        """Запись соответствия изображение -> профиль (на диск - при flush)"""
+        with self._lock:
+            data = self._load()
+            filename = profile_path.name
+            # После переименования изображения прежнее имя указывает на тот же профиль - убираем его
+            for image in [image for image, name in data.items() if name == filename]:
+                del data[image]
+            data[image_name.lower()] = filename
+            self._dirty = True
+    
+    def flush(self) -> None:
+        """Атомарная запись индекса на диск, если он изменился"""
+        with self._lock:
+            if self._dirty and self._data is not None:
+                write_json(self.path, self._data)
+                self._dirty = False
+
+
+# Промпт не зависит от изображения - собираем один раз при импорте
+_SYSTEM_PROMPT = """Ты эксперт по анализу профилей участников YARD Business Club.
+
+На изображении всегда есть следующие секции:
+- ФИО участника (имя и фамилия в заголовке)
+- ЭКСПЕРТИЗА (список областей экспертизы)
+- БИЗНЕС (описание бизнеса и компаний)
+- ХОББИ (список увлечений)
+- Семейное положение (может отсутствовать)
+- Контакты (могут быть Instagram, Telegram, WhatsApp, веб-сайты и другие)
+
+Верни результат СТРОГО в формате JSON:
+{
+    "name": "ФИО участника",
+    "expertise": "все пункты из секции ЭКСПЕРТИЗА через запятую или \\n если список",
+    "business": "полное описание из секции БИЗНЕС с переносами строк",
+    "hobbies": ["список хобби"],
+    "family_status": "семейное положение если есть",
+    "contacts": ["список ВСЕХ контактов в исходном формате - т.е. сайты, телефоны, соц сети и т.д."]
+}
+
+ВАЖНО: 
+1. Извлекай ВСЮ информацию из соответствующих секций
+2. ФИО пиши с заглавных букв на кириллице, НЕ КАПСОМ (пример: Иван Иванов, а не ИВАН ИВАНОВ). Сначала имя потом фамилия.
+3. В поле "business" сохраняй структуру текста - каждый пункт с новой строки через \\n
+4. В поле "expertise" если пункты идут списком, разделяй их через \\n
+5. В поле "contacts" включай ВСЕ контакты. Добавляй префиксы ТОЛЬКО если уверен:
+   - Instagram: @username → https://www.instagram.com/username
+   - Telegram: @username → https://t.me/username
+   - WhatsApp: номер → https://wa.me/номер
+   - Facebook: username → https://www.facebook.com/username
+   - TikTok: @username → https://www.tiktok.com/@username
+   - LinkedIn: username → https://www.linkedin.com/in/username
+   - Twitter: username → https://x.com/username
+   - YouTube: username → https://www.youtube.com/@username
+   - Веб-сайт: добавь https:// если его нет
+   ВАЖНО: Если не уверен в типе контакта - оставь как написано на изображении, без префикса!
+6. НЕ включай YBC.UZ в контакты - это сайт бизнес клуба
+7. Если поле отсутствует, установи null"""
+
+_USER_TEXT_CONTENT = {
+    "type": "text",
+    "text": "Проанализируй это изображение профиля участника YARD Business Club и извлеки всю информацию в формате JSON."
+}
+
+
 class ImageAnalyzerAgent:
     """Агент для анализа изображений профилей участников YARD Business Club"""
     
-    def __init__(self):
+    _SYSTEM_MESSAGE = SystemMessage(content=_SYSTEM_PROMPT)
+    
+    def __init__(self, use_cache: bool = True):
+        """
+        Args:
+            use_cache: False - извлекать заново даже уже обработанные изображения
+                (индекс source_image и кэш извлечения не читаются, но обновляются)
+        """
+        self.use_cache = use_cache
         self.llm = ChatOpenAI(
             model=config.IMAGE_MODEL,
             temperature=config.TEMPERATURE,
             api_key=config.OPENAI_API_KEY
         )
+        # Structured output: модель возвращает уже провалидированный MemberProfile,
+        # без поиска JSON в тексте ответа
+        self.structured_llm = self.llm.with_structured_output(MemberProfile)
         self.embedding_agent = None  # Lazy loading to avoid circular imports
+        self._source_index = _SourceIndex()  # source_image -> профиль, для поиска уже обработанных изображений
+        self._extraction_cache = ExtractionCache()  # хэш изображения -> ответ LLM
         
+    def flush(self) -> None:
+        """Запись накопленных изменений индекса изображений и кэша извлечения на диск (в конце прогона)"""
+        self._source_index.flush()
+        self._extraction_cache.flush()
+    
     def encode_image(self, image_path: str) -> str:
         """Кодирование изображения в base64"""
         # Validate path exists and is safe
@@ -26,113 +191,73 @@ class ImageAnalyzerAgent:
         if not image_file.exists() or not image_file.is_file():
             raise FileNotFoundError(f"Image file not found: {image_path}")
         
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return _encode_file(str(image_file))
+    
+    def _image_url(self, image_path: str) -> str:
+        """URL изображения для LLM: публичная ссылка, если задан IMAGE_URL_BASE, иначе data URL с base64"""
+        if config.IMAGE_URL_BASE:
+            return f"{config.IMAGE_URL_BASE}/{quote(Path(image_path).name)}"
+        return f"data:image/jpeg;base64,{self.encode_image(image_path)}"
+    
+    def _build_messages(self, image_url: str) -> list:
+        """Формирование сообщений для LLM по URL изображения"""
+        return [
+            self._SYSTEM_MESSAGE,
+            HumanMessage(
+                content=[
+                    _USER_TEXT_CONTENT,
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
+                        }
+                    }
+                ]
+            )
+        ]
     
-    def _ensure_list(self, value):
-        """Преобразование значения в список"""
-        if value is None:
-            return []
-        if isinstance(value, list):
-            return value
-        if isinstance(value, str):
-            return [value] if value else []
-        return []
+    def _cached_extraction(self, image_path: str) -> Tuple[str, Optional[MemberProfile]]:
+        """Хэш изображения и профиль, ранее извлеченный LLM из того же содержимого (или None)"""
+        key = hash_image(image_path)
+        extracted = self._extraction_cache.get(key) if self.use_cache else None
+        if extracted is None:
+            return key, None
+        say(f"Using cached extraction for: {Path(image_path).name}")
+        return key, MemberProfile.model_construct(**extracted)
     
     def analyze_image(self, image_path: str) -> Optional[MemberProfile]:
         """Анализ изображения и извлечение данных профиля"""
         try:
-            # Encode image
-            base64_image = self.encode_image(image_path)
-            
-            # Create prompt
-            system_prompt = """Ты эксперт по анализу профилей участников YARD Business Club.
-            
-            На изображении всегда есть следующие секции:
-            - ФИО участника (имя и фамилия в заголовке)
-            - ЭКСПЕРТИЗА (список областей экспертизы)
-            - БИЗНЕС (описание бизнеса и компаний)
-            - ХОББИ (список увлечений)
-            - Семейное положение (может отсутствовать)
-            - Контакты (могут быть Instagram, Telegram, WhatsApp, веб-сайты и другие)
+            key, profile = self._cached_extraction(image_path)
+            if profile is not None:
+                return profile
             
-            Верни результат СТРОГО в формате JSON:
-            {
-                "name": "ФИО участника",
-                "expertise": "все пункты из секции ЭКСПЕРТИЗА через запятую или \\n если список",
-                "business": "полное описание из секции БИЗНЕС с переносами строк",
-                "hobbies": ["список хобби"],
-                "family_status": "семейное положение если есть",
-                "contacts": ["список ВСЕХ контактов в исходном формате - т.е. сайты, телефоны, соц сети и т.д."]
-            }
-            
-            ВАЖНО: 
-            1. Извлекай ВСЮ информацию из соответствующих секций
-            2. ФИО пиши с заглавных букв на кириллице, НЕ КАПСОМ (пример: Иван Иванов, а не ИВАН ИВАНОВ). Сначала имя потом фамилия.
-            3. В поле "business" сохраняй структуру текста - каждый пункт с новой строки через \\n
-            4. В поле "expertise" если пункты идут списком, разделяй их через \\n
-            5. В поле "contacts" включай ВСЕ контакты. Добавляй префиксы ТОЛЬКО если уверен:
-               - Instagram: @username → https://www.instagram.com/username
-               - Telegram: @username → https://t.me/username
-               - WhatsApp: номер → https://wa.me/номер
-               - Facebook: username → https://www.facebook.com/username
-               - TikTok: @username → https://www.tiktok.com/@username
-               - LinkedIn: username → https://www.linkedin.com/in/username
-               - Twitter: username → https://x.com/username
-               - YouTube: username → https://www.youtube.com/@username
-               - Веб-сайт: добавь https:// если его нет
-               ВАЖНО: Если не уверен в типе контакта - оставь как написано на изображении, без префикса!
-            6. НЕ включай YBC.UZ в контакты - это сайт бизнес клуба
-            7. Если поле отсутствует, установи null"""
-            
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(
-                    content=[
-                        {
-                            "type": "text",
-                            "text": "Проанализируй это изображение профиля участника YARD Business Club и извлеки всю информацию в формате JSON."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                )
-            ]
-            
-            # Get response
-            response = self.llm.invoke(messages)
-            
-            # Parse JSON from response
-            json_str = response.content
-            # Clean up JSON if needed
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0]
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0]
-                
-            data = json.loads(json_str)
+            image_url = self._image_url(image_path)
+            profile = self.structured_llm.invoke(self._build_messages(image_url))
+            if profile is not None:
+                self._extraction_cache.put(key, profile.model_dump())
+            return profile
             
-            # Process and clean data
-            profile_data = {
-                "name": data.get("name", ""),
-                "expertise": data.get("expertise", ""),
-                "business": data.get("business", ""),
-                "hobbies": data.get("hobbies", []) if data.get("hobbies") else [],
-                "family_status": data.get("family_status"),
-                "contacts": data.get("contacts", []) if data.get("contacts") else []
-            }
-            
-            # Remove None values
-            profile_data = {k: v for k, v in profile_data.items() if v is not None}
+        except Exception as e:
+            say(f"Error analyzing image {image_path}: {str(e)}")
+            return None
+    
+    async def analyze_image_async(self, image_path: str) -> Optional[MemberProfile]:
+        """Асинхронный анализ изображения: запрос к LLM не блокирует другие изображения"""
+        try:
+            # Чтение файла (хэш, base64) и кэш на диске - в пуле потоков, чтобы не блокировать event loop
+            key, profile = await asyncio.to_thread(self._cached_extraction, image_path)
+            if profile is not None:
+                return profile
             
-            return MemberProfile(**profile_data)
+            image_url = await asyncio.to_thread(self._image_url, image_path)
+            profile = await self.structured_llm.ainvoke(self._build_messages(image_url))
+            if profile is not None:
+                await asyncio.to_thread(self._extraction_cache.put, key, profile.model_dump())
+            return profile
             
         except Exception as e:
-            print(f"Error analyzing image {image_path}: {str(e)}", flush=True)
+            say(f"Error analyzing image {image_path}: {str(e)}")
             return None
     
     def save_profile_to_file(self, profile: MemberProfile, filename: Optional[str] = None) -> str:
@@ -149,17 +274,92 @@ class ImageAnalyzerAgent:
         
         filepath = config.PROFILES_DIR / filename
         
-        # Save as markdown
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(profile.to_markdown())
+        # Markdown нужен только людям - пишем в фоне, чтобы не задерживать обработку
+        if config.WRITE_MARKDOWN:
+            markdown = profile.to_markdown()
+            threading.Thread(
+                target=filepath.write_text, args=(markdown,), kwargs={'encoding': 'utf-8'}, daemon=True
+            ).start()
         
         # Also save as JSON for easier parsing
         json_filepath = filepath.with_suffix('.json')
-        with open(json_filepath, 'w', encoding='utf-8') as f:
-            json.dump(profile.model_dump(), f, ensure_ascii=False, indent=2)
+        write_json(json_filepath, profile.model_dump())
+        ProfileLoader.mark_changed()  # снимок профилей для анализа перестроится
+        
+        # Keep duplicate-detection index in sync
+        if profile.source_image:
+            self._source_index.set(profile.source_image, json_filepath)
         
         return str(filepath)
     
+    def _find_cached_profile(self, image_path: Path) -> Optional[MemberProfile]:
+        """Поиск уже извлеченного профиля для изображения (сравнение имен файлов без учета регистра)"""
+        if not self.use_cache:
+            return None
+        profile_path = self._source_index.get(image_path.name)
+        if profile_path and profile_path.exists():
+            say(f"Image already processed: {image_path.name} -> {profile_path.stem}")
+            # Сохраненный профиль уже провалидирован при извлечении
+            return MemberProfile.model_construct(**read_json(profile_path))
+        return None
+    
+    def _store_profile(self, profile: MemberProfile, image_path: Path) -> MemberProfile:
+        """Сохранение извлеченного профиля и переименование изображения по ФИО"""
+        # Add source image to profile
+        profile.source_image = image_path.name
+        
+        # Save to file
+        filepath = self.save_profile_to_file(profile)
+        say(f"Profile saved to: {filepath}")
+        
+        # Rename image file if name was extracted
+        if profile.name and image_path.exists():
+            safe_name = sanitize_filename(profile.name)
+            new_image_name = f"{safe_name}{image_path.suffix}"
+            new_image_path = image_path.parent / new_image_name
+            
+            # Check if we need to rename (different name or just case change)
+            if image_path.name != new_image_name:
+                # On case-insensitive filesystems (like macOS), we need special handling
+                # Check if it's the same file (case-insensitive match)
+                is_case_only_change = image_path.name.lower() == new_image_name.lower()
+                
+                if is_case_only_change:
+                    # It's the same file with different case, need to rename via temp file
+                    temp_path = image_path.with_name(f"{image_path.stem}.__casefix__{image_path.suffix}")
+                    try:
+                        image_path.rename(temp_path)
+                        temp_path.rename(new_image_path)
+                        say(f"Image renamed (case change): {image_path.name} -> {new_image_name}")
+                        profile.source_image = new_image_name
+                        # Re-save profile with updated image name
+                        self.save_profile_to_file(profile, Path(filepath).name)
+                    except Exception as e:
+                        say(f"Could not rename image: {e}")
+                    finally:
+                        # Restore original name if the second rename did not happen
+                        if temp_path.exists():
+                            try:
+                                temp_path.rename(image_path)
+                            except OSError:
+                                pass
+                else:
+                    # Different file name entirely
+                    if new_image_path.exists():
+                        say(f"Target image already exists: {new_image_name}")
+                        profile.source_image = image_path.name  # Keep original name
+                    else:
+                        try:
+                            image_path.rename(new_image_path)
+                            say(f"Image renamed: {image_path.name} -> {new_image_name}")
+                            profile.source_image = new_image_name
+                            # Re-save profile with updated image name
+                            self.save_profile_to_file(profile, Path(filepath).name)
+                        except Exception as e:
+                            say(f"Could not rename image: {e}")
+        
+        return profile
+    
     def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """LangGraph node function"""
         workflow_state = WorkflowState(**state)
@@ -168,86 +368,74 @@ class ImageAnalyzerAgent:
             workflow_state.error = "No image path provided"
             return workflow_state.model_dump()
         
-        # Check if already processed
-        from pathlib import Path
         image_path = Path(workflow_state.image_path)
         
         # Check if this image was already processed
-        # Проверяем по имени профиля (не зависит от регистра имени файла изображения)
-        existing_profiles = list(config.PROFILES_DIR.glob("*.json"))
-        for profile_path in existing_profiles:
-            with open(profile_path, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
-                # Сравниваем имена файлов без учета регистра
-                if existing_data.get('source_image') and \
-                   existing_data.get('source_image').lower() == image_path.name.lower():
-                    print(f"Image already processed: {image_path.name} -> {profile_path.stem}", flush=True)
-                    workflow_state.profile = MemberProfile(**existing_data)
-                    workflow_state.raw_text = workflow_state.profile.to_markdown()
-                    workflow_state.was_cached = True  # Отмечаем, что профиль был загружен из кэша
-                    return workflow_state.model_dump()
+        cached_profile = self._find_cached_profile(image_path)
+        if cached_profile:
+            workflow_state.profile = cached_profile
+            workflow_state.raw_text = cached_profile.to_markdown()
+            workflow_state.was_cached = True  # Отмечаем, что профиль был загружен из кэша
+            return workflow_state.model_dump()
         
         # Analyze image
         profile = self.analyze_image(workflow_state.image_path)
         
         if profile:
-            # Add source image to profile
-            profile.source_image = image_path.name
-            
-            # Save to file
-            filepath = self.save_profile_to_file(profile)
-            print(f"Profile saved to: {filepath}", flush=True)
-            
-            # Rename image file if name was extracted
-            if profile.name and image_path.exists():
-                safe_name = sanitize_filename(profile.name)
-                new_image_name = f"{safe_name}{image_path.suffix}"
-                new_image_path = image_path.parent / new_image_name
-                
-                # Check if we need to rename (different name or just case change)
-                if image_path.name != new_image_name:
-                    # On case-insensitive filesystems (like macOS), we need special handling
-                    # Check if it's the same file (case-insensitive match)
-                    is_case_only_change = image_path.name.lower() == new_image_name.lower()
-                    
-                    if is_case_only_change:
-                        # It's the same file with different case, need to rename via temp file
-                        import uuid
-                        temp_name = f"temp_{uuid.uuid4().hex}{image_path.suffix}"
-                        temp_path = image_path.parent / temp_name
-                        try:
-                            image_path.rename(temp_path)
-                            temp_path.rename(new_image_path)
-                            print(f"Image renamed (case change): {image_path.name} -> {new_image_name}", flush=True)
-                            profile.source_image = new_image_name
-                            # Re-save profile with updated image name
-                            self.save_profile_to_file(profile, Path(filepath).name)
-                        except Exception as e:
-                            print(f"Could not rename image: {e}", flush=True)
-                            # Try to restore original name if temp rename succeeded
-                            if temp_path.exists():
-                                try:
-                                    temp_path.rename(image_path)
-                                except:
-                                    pass
-                    else:
-                        # Different file name entirely
-                        if new_image_path.exists():
-                            print(f"Target image already exists: {new_image_name}", flush=True)
-                            profile.source_image = image_path.name  # Keep original name
-                        else:
-                            try:
-                                image_path.rename(new_image_path)
-                                print(f"Image renamed: {image_path.name} -> {new_image_name}", flush=True)
-                                profile.source_image = new_image_name
-                                # Re-save profile with updated image name
-                                self.save_profile_to_file(profile, Path(filepath).name)
-                            except Exception as e:
-                                print(f"Could not rename image: {e}", flush=True)
-            
+            profile = self._store_profile(profile, image_path)
             workflow_state.profile = profile
             workflow_state.raw_text = profile.to_markdown()
         else:
             workflow_state.error = f"Failed to analyze image: {workflow_state.image_path}"
         
-        return workflow_state.model_dump()
\ No newline at end of file
+        return workflow_state.model_dump()
+    
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Async LangGraph node function"""
+        workflow_state = WorkflowState(**state)
+        
+        if not workflow_state.image_path:
+            workflow_state.error = "No image path provided"
+            return workflow_state.model_dump()
+        
+        image_path = Path(workflow_state.image_path)
+        
+        cached_profile = await asyncio.to_thread(self._find_cached_profile, image_path)
+        if cached_profile:
+            workflow_state.profile = cached_profile
+            workflow_state.raw_text = cached_profile.to_markdown()
+            workflow_state.was_cached = True
+            return workflow_state.model_dump()
+        
+        profile = await self.analyze_image_async(workflow_state.image_path)
+        
+        if profile:
+            # Запись на диск и переименование - в пуле потоков
+            profile = await asyncio.to_thread(self._store_profile, profile, image_path)
+            workflow_state.profile = profile
+            workflow_state.raw_text = profile.to_markdown()
+        else:
+            workflow_state.error = f"Failed to analyze image: {workflow_state.image_path}"
+        
+        return workflow_state.model_dump()
+    
+    async def run_batch(self, image_paths: List[str], concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Конкурентная обработка нескольких изображений
+        
+        Args:
+            image_paths: Пути к изображениям
+            concurrency: Максимальное количество одновременных запросов к LLM
+            
+        Returns:
+            Состояния workflow для каждого изображения (в порядке image_paths)
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def process(image_path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.acall({"image_path": image_path})
+        
+        results = await asyncio.gather(*(process(path) for path in image_paths))
+        await asyncio.to_thread(self.flush)
+        return results
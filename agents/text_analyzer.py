@@ -1,22 +1,36 @@
-import json
-from typing import Dict, Any, List, Optional
-from pathlib import Path
-import sys
-
-# Добавляем корневую директорию проекта в sys.path
-current_dir = Path(__file__).parent
-parent_dir = current_dir.parent
-if str(parent_dir) not in sys.path:
-    sys.path.insert(0, str(parent_dir))
+import asyncio
+import weakref
+from typing import Dict, Any, List, Optional, Tuple
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
-from utils.data_models import MemberProfile, AnalysisRequest, AnalysisResult, WorkflowState, sanitize_filename
+from utils.data_models import MemberProfile, AnalysisRequest, AnalysisResult, MatchDecision, MatchDecisionBatch, WorkflowState, sanitize_filename
 from utils.profile_loader import ProfileLoader
+from utils.json_io import write_json
+from utils.decision_cache import DecisionCache
+from utils.query_cache import QueryCache
 from agents.embedding_agent import EmbeddingAgent
 import config
 
 
+# Системные промпты статичны - собираем сообщения один раз при импорте
+_TASK_PROMPTS = {
+    "professional": "Ты эксперт по бизнес-профилям. Определи, соответствует ли профиль профессиональному критерию.",
+    "personal": "Ты эксперт по личным интересам. Определи, соответствует ли профиль личному критерию (хобби, семья).",
+}
+_ANSWER_PROMPT = "Дай краткое обоснование (reasoning) и вердикт (matches). Будь внимателен к деталям."
+_BATCH_PROMPT = "Профили пронумерованы: оцени каждый независимо и верни по решению на каждый с его номером (number)."
+
+_SYSTEM_MESSAGES = {
+    search_type: SystemMessage(content=f"{task}\n{_ANSWER_PROMPT}")
+    for search_type, task in _TASK_PROMPTS.items()
+}
+_BATCH_SYSTEM_MESSAGES = {
+    search_type: SystemMessage(content=f"{task}\n{_ANSWER_PROMPT}\n{_BATCH_PROMPT}")
+    for search_type, task in _TASK_PROMPTS.items()
+}
+
+
 class TextAnalyzerAgent:
     """Агент для анализа и фильтрации профилей по заданным критериям"""
     
@@ -26,7 +40,92 @@ class TextAnalyzerAgent:
             temperature=config.TEMPERATURE,
             api_key=config.OPENAI_API_KEY
         )
+        # Ответ модели сразу приходит как MatchDecision - без разбора JSON из текста
+        self.structured_llm = self.llm.with_structured_output(MatchDecision)
+        self.batch_llm = self.llm.with_structured_output(MatchDecisionBatch)
+        # Решения по паре (критерий, профиль) переживают перезапуск - повторный запрос без LLM
+        self.decision_cache = DecisionCache(config.CACHE_DIR / "llm_decisions.db")
         self.embedding_agent = EmbeddingAgent()
+        # Тексты профилей для промпта: (тип поиска, поля профиля) -> текст; LRU, чтобы старые
+        # версии отредактированных профилей не копились в процессе бота
+        self._profile_texts = QueryCache(max_size=4096, ttl_seconds=None)
+        # Ограничение одновременных запросов к LLM (rate limits OpenAI): один семафор на event loop,
+        # т.к. smart_analyze создает свой loop, а бот работает в одном общем
+        self._llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+    
+    def _llm_semaphore(self) -> asyncio.Semaphore:
+        """Семафор LLM-запросов для текущего event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._llm_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(config.LLM_MAX_CONCURRENCY)
+            self._llm_semaphores[loop] = semaphore
+        return semaphore
+    
+    def _profile_text(self, profile: MemberProfile, search_type: str) -> str:
+        """Текст профиля для промпта (кэшируется по содержимому используемых полей)"""
+        personal = search_type == "personal"
+        # Ключ - сами поля, попадающие в текст: после переизвлечения или правки профиля
+        # долгоживущий процесс бота не отправит в LLM устаревший текст
+        if personal:
+            key = ("personal", profile.name, tuple(profile.hobbies or ()), profile.family_status)
+        else:
+            key = ("professional", profile.name, profile.expertise, profile.business)
+        text = self._profile_texts.get(key)
+        if text is None:
+            if personal:
+                # Для личного поиска - только личные данные
+                text = (
+                    f"Имя: {profile.name}\n"
+                    f"Хобби: {', '.join(profile.hobbies) if profile.hobbies else 'не указаны'}\n"
+                    f"Семейное положение: {profile.family_status or 'не указано'}"
+                )
+            else:
+                # Для профессионального поиска - бизнес данные
+                text = (
+                    f"Имя: {profile.name}\n"
+                    f"Экспертиза: {profile.expertise}\n"
+                    f"Бизнес: {profile.business}"
+                )
+            self._profile_texts.put(key, text)
+        return text
+    
+    def _build_messages(self, profile: MemberProfile, criteria: str, search_type: str) -> list:
+        """Формирование сообщений для LLM: поля профиля и промпт зависят от типа поиска"""
+        search_type = "personal" if search_type == "personal" else "professional"
+        user_prompt = f'Критерий: "{criteria}"\n\nПрофиль:\n{self._profile_text(profile, search_type)}'
+        return [_SYSTEM_MESSAGES[search_type], HumanMessage(content=user_prompt)]
+    
+    def _build_batch_messages(self, profiles: List[MemberProfile], criteria: str, search_type: str) -> list:
+        """Сообщения для пакетного анализа: несколько пронумерованных профилей в одном запросе"""
+        search_type = "personal" if search_type == "personal" else "professional"
+        profiles_text = "\n\n".join(
+            f"Профиль {number}:\n{self._profile_text(profile, search_type)}"
+            for number, profile in enumerate(profiles, 1)
+        )
+        user_prompt = f'Критерий: "{criteria}"\n\n{profiles_text}'
+        return [_BATCH_SYSTEM_MESSAGES[search_type], HumanMessage(content=user_prompt)]
+    
+    def _to_result(self, profile: MemberProfile, decision: MatchDecision) -> AnalysisResult:
+        """Преобразование решения LLM в AnalysisResult"""
+        return AnalysisResult(
+            profile_name=profile.name,
+            matches=decision.matches,
+            reasoning=decision.reasoning,
+            profile=profile
+        )
+    
+    def _error_result(self, profile: MemberProfile, error: Exception) -> AnalysisResult:
+        """Результат для профиля, который не удалось проанализировать"""
+        print(f"Error analyzing profile {profile.name}: {str(error)}", flush=True)
+        return AnalysisResult(
+            profile_name=profile.name,
+            matches=False,
+            reasoning=f"Ошибка анализа: {str(error)}",
+            profile=profile
+        )
     
     def analyze_profile(self, profile: MemberProfile, criteria: str, search_type: str = "professional") -> AnalysisResult:
         """Анализ профиля на соответствие критериям
@@ -36,141 +135,215 @@ class TextAnalyzerAgent:
             criteria: Критерии поиска
             search_type: "professional" или "personal" - определяет какие поля анализировать
         """
+        key = DecisionCache.make_key(config.TEXT_MODEL, search_type, criteria, profile)
+        decision = self.decision_cache.get(key)
+        if decision is not None:
+            return self._to_result(profile, decision)
         
-        # Prepare profile text based on search type
-        if search_type == "personal":
-            # Для личного поиска - только личные данные
-            profile_text = f"""
-            Имя: {profile.name}
-            Хобби: {', '.join(profile.hobbies) if profile.hobbies else 'не указаны'}
-            Семейное положение: {profile.family_status or 'не указано'}
-            """
-            system_prompt = """Ты эксперт по анализу личных интересов и предпочтений.
-        Твоя задача - определить, соответствует ли профиль заданным личным критериям (хобби, семья)."""
-        else:
-            # Для профессионального поиска - бизнес данные
-            profile_text = f"""
-            Имя: {profile.name}
-            Экспертиза: {profile.expertise}
-            Бизнес: {profile.business}
-            """
-            system_prompt = """Ты эксперт по анализу бизнес-профилей.
-        Твоя задача - определить, соответствует ли профиль заданным профессиональным критериям."""
-        
-        # Добавляем формат JSON к промпту
-        system_prompt += """
-        
-        Верни результат СТРОГО в формате JSON:
-        {
-            "reasoning": "краткое обоснование решения",
-            "matches": true/false
-        }
+        try:
+            decision = self.structured_llm.invoke(self._build_messages(profile, criteria, search_type))
+            self.decision_cache.put(key, decision)
+            return self._to_result(profile, decision)
+        except Exception as e:
+            return self._error_result(profile, e)
+    
+    async def _adecide(self, profile: MemberProfile, criteria: str, search_type: str) -> MatchDecision:
+        """Один запрос к LLM по одному профилю (без кэша решений)"""
+        async with self._llm_semaphore():
+            return await self.structured_llm.ainvoke(self._build_messages(profile, criteria, search_type))
+    
+    async def aanalyze_profile(self, profile: MemberProfile, criteria: str, search_type: str = "professional") -> AnalysisResult:
+        """Асинхронная версия analyze_profile - запросы по разным профилям выполняются параллельно"""
+        # SQLite (чтение и commit с fsync) - в пуле потоков, чтобы не блокировать event loop бота
+        key = DecisionCache.make_key(config.TEXT_MODEL, search_type, criteria, profile)
+        decision = await asyncio.to_thread(self.decision_cache.get, key)
+        if decision is not None:
+            return self._to_result(profile, decision)
         
-        Будь внимателен к деталям."""
+        try:
+            decision = await self._adecide(profile, criteria, search_type)
+            await asyncio.to_thread(self.decision_cache.put, key, decision)
+            return self._to_result(profile, decision)
+        except Exception as e:
+            return self._error_result(profile, e)
+    
+    async def aanalyze_profiles_batched(
+        self,
+        profiles: List[MemberProfile],
+        criteria: str,
+        search_type: str = "professional",
+        batch_size: int = config.LLM_BATCH_SIZE
+    ) -> List[AnalysisResult]:
+        """
+        Пакетный анализ: до batch_size профилей в одном запросе к LLM
         
-        user_prompt = f"""Проанализируй профиль на соответствие критерию: "{criteria}"
+        Системный промпт и накладные расходы запроса делятся на весь пакет.
+        Профили из кэша решений в запрос не попадают; профили, по которым модель
+        не вернула решение, досчитываются по одному. Кэш решений читается одним
+        запросом и пополняется одной транзакцией в конце - в пуле потоков, вне event loop.
         
-        Профиль:
-        {profile_text}
+        Args:
+            profiles: Профили для анализа
+            criteria: Критерии поиска
+            search_type: "professional" или "personal"
+            batch_size: Количество профилей в одном запросе
+            
+        Returns:
+            Результаты в порядке profiles
         """
+        results: List[Optional[AnalysisResult]] = [None] * len(profiles)
+        keys = [DecisionCache.make_key(config.TEXT_MODEL, search_type, criteria, p) for p in profiles]
+        # Новые решения LLM: сохраняются в кэш одним commit после всех запросов
+        fresh: List[Tuple[str, MatchDecision]] = []
         
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
+        cached = await asyncio.to_thread(self.decision_cache.get_many, keys)
+        pending = []
+        for i, (profile, key) in enumerate(zip(profiles, keys)):
+            decision = cached.get(key)
+            if decision is not None:
+                results[i] = self._to_result(profile, decision)
+            else:
+                pending.append(i)
         
-        try:
-            response = self.llm.invoke(messages)
-            
-            # Parse JSON response
-            json_str = response.content
-            if "```json" in json_str:
-                json_str = json_str.split("```json")[1].split("```")[0]
-            elif "```" in json_str:
-                json_str = json_str.split("```")[1].split("```")[0]
-            
-            data = json.loads(json_str)
+        async def decide_single(i: int) -> None:
+            try:
+                decision = await self._adecide(profiles[i], criteria, search_type)
+            except Exception as e:
+                results[i] = self._error_result(profiles[i], e)
+                return
+            fresh.append((keys[i], decision))
+            results[i] = self._to_result(profiles[i], decision)
+        
+        async def run_batch(indices: List[int]) -> None:
+            try:
+                async with self._llm_semaphore():
+                    batch = await self.batch_llm.ainvoke(
+                        self._build_batch_messages([profiles[i] for i in indices], criteria, search_type)
+                    )
+                decisions = batch.decisions
+            except Exception as e:
+                print(f"Error analyzing batch of {len(indices)} profiles: {str(e)}", flush=True)
+                decisions = []
             
-            return AnalysisResult(
-                profile_name=profile.name,
-                matches=data.get("matches", False),
-                reasoning=data.get("reasoning", "")
-            )
+            for decision in decisions:
+                if 1 <= decision.number <= len(indices):
+                    i = indices[decision.number - 1]
+                    match = MatchDecision(reasoning=decision.reasoning, matches=decision.matches)
+                    fresh.append((keys[i], match))
+                    results[i] = self._to_result(profiles[i], match)
             
-        except Exception as e:
-            print(f"Error analyzing profile {profile.name}: {str(e)}", flush=True)
-            return AnalysisResult(
-                profile_name=profile.name,
-                matches=False,
-                reasoning=f"Ошибка анализа: {str(e)}"
-            )
+            # Модель пропустила профиль или запрос упал - анализируем по одному
+            missing = [i for i in indices if results[i] is None]
+            await asyncio.gather(*(decide_single(i) for i in missing))
+        
+        await asyncio.gather(*(
+            run_batch(pending[start:start + batch_size])
+            for start in range(0, len(pending), batch_size)
+        ))
+        
+        await asyncio.to_thread(self.decision_cache.put_many, fresh)
+        return results
     
     def load_profile_by_name(self, name: str) -> Optional[MemberProfile]:
         """Загрузка профиля по имени"""
         return ProfileLoader.load_by_name(name)
     
-    def smart_analyze(self, criteria: str, search_type: str = "professional", top_k: int = 10) -> List[AnalysisResult]:
+    def _load_candidates(self, profile_scores: List[Tuple[str, float]]) -> List[Tuple[str, MemberProfile, float]]:
+        """Загрузка профилей для LLM анализа: (имя, профиль, близость); ненайденные пропускаются"""
+        profiles = ProfileLoader.load_many(name for name, _ in profile_scores)
+        return [
+            (profile_name, profiles[profile_name], similarity_score)
+            for profile_name, similarity_score in profile_scores
+            if profile_name in profiles
+        ]
+    
+    def smart_analyze(
+        self, criteria: str, search_type: str = "professional", top_k: int = 10, index: str = "flat"
+    ) -> Tuple[List[AnalysisResult], List[Tuple[str, float]]]:
+        """Синхронная обертка над asmart_analyze (CLI и код без event loop)"""
+        return asyncio.run(self.asmart_analyze(criteria, search_type, top_k, index))
+    
+    async def asmart_analyze(
+        self, criteria: str, search_type: str = "professional", top_k: int = 10, index: str = "flat"
+    ) -> Tuple[List[AnalysisResult], List[Tuple[str, float]]]:
         """
         Умный анализ с использованием эмбеддингов
-        Анализирует топ-K профилей через LLM, но возвращает ВСЕ профили с их косинусной близостью
+        Анализирует топ-K профилей через LLM, остальные профили возвращает только с косинусной близостью
+        Запросы к LLM по топ-K профилям отправляются параллельно
         
         Args:
             criteria: Критерии поиска
             search_type: "professional" или "personal"
             top_k: Количество профилей для анализа через LLM (по умолчанию 10)
+            index: "flat" - точный скоринг ВСЕХ профилей (в ответе весь корпус);
+                "hnsw" - только top_k * 4 ближайших кандидатов из HNSW индекса ChromaDB
+            
+        Returns:
+            Tuple[results, scores_tail] - результаты LLM анализа и пары (имя, близость)
+            для всех остальных профилей в порядке убывания близости
         """
         results = []
         
         print(f"Getting all profiles with similarity scores ({search_type} mode)...", flush=True)
         
-        # 1. Получаем ВСЕ профили с их косинусной близостью
-        all_profiles_with_scores = self.embedding_agent.get_all_profiles_with_scores(
-            query=criteria,
-            search_type=search_type
-        )
+        # 1. Получаем ВСЕ профили (или кандидатов из HNSW) с их косинусной близостью
+        # (эмбеддинг запроса и поиск в ChromaDB синхронные - выносим из event loop)
+        if index == "hnsw":
+            all_profiles_with_scores = await asyncio.to_thread(
+                self.embedding_agent.search_nearest,
+                query=criteria,
+                search_type=search_type,
+                k=max(top_k * 4, 1),
+                index="hnsw"
+            )
+        else:
+            all_profiles_with_scores = await asyncio.to_thread(
+                self.embedding_agent.get_all_profiles_with_scores,
+                query=criteria,
+                search_type=search_type,
+                save_scores=config.SAVE_EMBEDDING_SCORES
+            )
         
         print(f"Found {len(all_profiles_with_scores)} total profiles", flush=True)
         
-        # 2. Создаем словарь для быстрого доступа к scores
-        scores_dict = {name: score for name, score in all_profiles_with_scores}
-        
-        # 3. Анализируем только топ-K через LLM
+        # 2. Анализируем только топ-K через LLM
         top_k_for_llm = all_profiles_with_scores[:top_k]
         analyzed_names = set()
         
         print(f"Analyzing top {len(top_k_for_llm)} candidates with LLM...", flush=True)
         
-        for profile_name, similarity_score in top_k_for_llm:
-            profile = self.load_profile_by_name(profile_name)
+        # Чтение JSON профилей (и возможное построение индекса имен) - тоже вне event loop
+        candidates = await asyncio.to_thread(self._load_candidates, top_k_for_llm)
+        
+        analyzed = await self.aanalyze_profiles_batched(
+            [profile for _, profile, _ in candidates], criteria, search_type
+        )
+        
+        for (profile_name, profile, similarity_score), result in zip(candidates, analyzed):
+            result.similarity_score = similarity_score  # Добавляем косинусную близость
+            results.append(result)
+            analyzed_names.add(profile_name)
             
-            if profile:
-                result = self.analyze_profile(profile, criteria, search_type)
-                result.similarity_score = similarity_score  # Добавляем косинусную близость
-                results.append(result)
-                analyzed_names.add(profile_name)
-                
-                print(f"Analyzed {profile.name}: {'✓' if result.matches else '✗'} (similarity: {similarity_score:.3f})", flush=True)
-        
-        # 4. Добавляем все остальные профили БЕЗ анализа через LLM
-        print(f"Adding remaining {len(all_profiles_with_scores) - len(analyzed_names)} profiles without LLM analysis...", flush=True)
-        
-        for profile_name, similarity_score in all_profiles_with_scores:
-            if profile_name not in analyzed_names:
-                # Создаем результат без LLM анализа
-                result = AnalysisResult(
-                    profile_name=profile_name,
-                    matches=False,  # По умолчанию не подходит (не анализировали через LLM)
-                    reasoning="",  # Пустое обоснование (не анализировали)
-                    similarity_score=similarity_score
-                )
-                results.append(result)
+            print(f"Analyzed {profile.name}: {'✓' if result.matches else '✗'} (similarity: {similarity_score:.3f})", flush=True)
         
-        print(f"Total results: {len(results)} profiles", flush=True)
-        return results
+        # 3. Остальные профили БЕЗ анализа через LLM - только имя и близость
+        scores_tail = [
+            (profile_name, similarity_score)
+            for profile_name, similarity_score in all_profiles_with_scores
+            if profile_name not in analyzed_names
+        ]
+        
+        print(f"Total results: {len(results)} analyzed, {len(scores_tail)} ranked by similarity only", flush=True)
+        return results, scores_tail
     
     
-    def save_analysis_results(self, results: List[AnalysisResult], criteria: str) -> str:
-        """Сохранение результатов анализа"""
+    def save_analysis_results(
+        self,
+        results: List[AnalysisResult],
+        criteria: str,
+        scores_tail: Optional[List[Tuple[str, float]]] = None
+    ) -> str:
+        """Сохранение результатов анализа (профили без LLM анализа - компактными парами [имя, близость])"""
         from datetime import datetime
         
         # Create filename with underscores instead of spaces
@@ -184,13 +357,14 @@ class TextAnalyzerAgent:
         results_data = {
             "criteria": criteria,
             "timestamp": timestamp,
-            "total_profiles": len(results),
+            "total_profiles": len(results) + len(scores_tail or []),
             "matched_profiles": sum(1 for r in results if r.matches),
-            "results": [r.model_dump() for r in results]
+            # model_dump, а не __dict__: поле profile (exclude=True) в файл не попадает
+            "results": [r.model_dump() for r in results],
+            "unanalyzed_scores": scores_tail or []
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(results_data, f, ensure_ascii=False, indent=2)
+        write_json(filepath, results_data)
         
         print(f"Analysis results saved to: {filepath}", flush=True)
         return str(filepath)
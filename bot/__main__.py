@@ -0,0 +1,3 @@
+from bot.bot import run
+
+run()
@@ -1,20 +1,72 @@
 import asyncio
-from typing import List, Dict, Any
-from pathlib import Path
-import sys
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
 
-# Добавляем родительскую директорию в путь для импорта
-parent_dir = Path(__file__).parent.parent
-if str(parent_dir) not in sys.path:
-    sys.path.insert(0, str(parent_dir))
+import numpy as np
 
 from agents.text_analyzer import TextAnalyzerAgent
+from utils.profile_loader import ProfileLoader
+from utils.query_cache import QueryCache
+import config
+
+
+# Один агент на процесс бота: ChatOpenAI, клиенты ChromaDB и кэши переиспользуются между запросами
+_ANALYZER: Optional[TextAnalyzerAgent] = None
+
+# Готовые ответы: (хэш критерия, режим, top_k) -> (вектор критерия, results, scores_tail).
+# Вектор нужен для нечеткого попадания - похожий критерий другого пользователя отдается из кэша
+_RESULTS_CACHE = QueryCache(max_size=128, ttl_seconds=None)
+# Версия директории профилей, для которой заполнен кэш (см. ProfileLoader.version)
+_results_version: Optional[int] = None
+
+
+def get_analyzer() -> TextAnalyzerAgent:
+    """Общий экземпляр TextAnalyzerAgent (создается при первом обращении)"""
+    global _ANALYZER
+    if _ANALYZER is None:
+        _ANALYZER = TextAnalyzerAgent()
+    return _ANALYZER
+
+
+def _cache_key(criteria: str, search_type: str, top_k: int) -> Tuple[str, str, int]:
+    """Ключ кэша ответов: регистр и пробелы по краям критерия не важны"""
+    criteria_norm = criteria.strip().lower()
+    digest = hashlib.blake2b(criteria_norm.encode('utf-8'), digest_size=16).hexdigest()
+    return digest, search_type, top_k
+
+
+def _check_version() -> None:
+    """Сброс кэша ответов, если профили изменились"""
+    global _results_version
+    version = ProfileLoader.version()
+    if version != _results_version:
+        _RESULTS_CACHE.clear()
+        _results_version = version
+
+
+def _find_similar(query_vec: np.ndarray, search_type: str, top_k: int) -> Optional[Tuple[list, list]]:
+    """Закэшированный ответ для самого похожего критерия с тем же режимом и top_k (если он достаточно близок)"""
+    entries = [
+        value for (_, mode, k), value in _RESULTS_CACHE.items()
+        if mode == search_type and k == top_k
+    ]
+    if not entries:
+        return None
+    
+    similarities = np.stack([vector for vector, _, _ in entries]) @ query_vec
+    best = int(np.argmax(similarities))
+    if similarities[best] <= config.SEMANTIC_CACHE_THRESHOLD:
+        return None
+    _, results, scores_tail = entries[best]
+    return results, scores_tail
 
 
 async def analyze_profiles(criteria: str, search_type: str = "professional", top_k: int = 10):
     """
     Асинхронная обертка для анализа профилей
-    Теперь возвращает ВСЕ профили с их косинусной близостью
+    Возвращает результаты AI анализа и косинусную близость для всех остальных профилей
+    
+    Повторный или близкий по смыслу запрос (тот же режим и top_k) отдается из кэша.
     
     Args:
         criteria: Критерий поиска
@@ -22,22 +74,32 @@ async def analyze_profiles(criteria: str, search_type: str = "professional", top
         top_k: Количество профилей для анализа через AI (0-30, по умолчанию 10)
     
     Returns:
-        Список объектов AnalysisResult (со всеми полями включая similarity_score)
+        Tuple[results, scores_tail] - объекты AnalysisResult для проанализированных через AI
+        профилей и пары (имя, similarity_score) для остальных
     """
     
-    def _analyze():
-        analyzer = TextAnalyzerAgent()
-        
-        results = analyzer.smart_analyze(
-            criteria=criteria,
-            search_type=search_type,
-            top_k=top_k
-        )
-        
-        # Возвращаем результаты как есть (с similarity_score)
-        return results
-    
-    loop = asyncio.get_event_loop()
-    results = await loop.run_in_executor(None, _analyze)
-    
-    return results
\ No newline at end of file
+    # Обычно агент уже создан при старте бота; если нет - конструктор (синхронное
+    # открытие ChromaDB) выполняем в пуле потоков, а сам анализ идет в event loop бота
+    analyzer = _ANALYZER or await asyncio.to_thread(get_analyzer)
+    
+    _check_version()
+    key = _cache_key(criteria, search_type, top_k)
+    cached = _RESULTS_CACHE.get(key)
+    if cached is not None:
+        _, results, scores_tail = cached
+        return results, scores_tail
+    
+    # Эмбеддинг критерия все равно нужен для ранжирования и кэшируется агентом,
+    # поэтому нечеткий поиск не добавляет запросов к OpenAI
+    query_vec = await asyncio.to_thread(analyzer.embedding_agent.query_vector, criteria)
+    similar = _find_similar(query_vec, search_type, top_k)
+    if similar is not None:
+        return similar
+    
+    results, scores_tail = await analyzer.asmart_analyze(
+        criteria=criteria,
+        search_type=search_type,
+        top_k=top_k
+    )
+    _RESULTS_CACHE.put(key, (query_vec, results, scores_tail))
+    return results, scores_tail
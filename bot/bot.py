@@ -1,17 +1,20 @@
-#!/usr/bin/env python3
 import asyncio
 import logging
 import sys
-from pathlib import Path
-
-sys.path.append(str(Path(__file__).parent.parent))
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
-from handlers import router
-from bot_config import BOT_TOKEN
+try:
+    import uvloop  # Event loop на libuv; на Windows недоступен - там стандартный asyncio
+except ImportError:
+    uvloop = None
+
+from bot.handlers import router
+from bot.analyzer import get_analyzer
+from bot.bot_config import BOT_TOKEN
+from bot.profiling import install as install_profiler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -33,13 +36,25 @@ async def main():
     dp = Dispatcher()
     dp.include_router(router)
     
+    # Создаем агента анализа и загружаем матрицы эмбеддингов заранее,
+    # чтобы первый запрос пользователя не ждал инициализации
+    analyzer = await asyncio.to_thread(get_analyzer)
+    await asyncio.to_thread(analyzer.embedding_agent.preload_corpus)
+    
+    # Отладочное профилирование event loop (только при BOT_PROFILE=true)
+    install_profiler(asyncio.get_running_loop())
+    
     await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 
-if __name__ == "__main__":
+def run():
+    """Запуск бота (python -m bot из корня проекта)"""
     try:
         logger.info("Запуск бота...")
-        asyncio.run(main())
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен")
     except Exception as e:
@@ -5,4 +5,8 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
 
-BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
\ No newline at end of file
+BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+
+# Профилирование обработчиков (время выполнения, блокировки event loop) в data/bot_profile.log.
+# Только для отладки - в продакшене не включать
+BOT_PROFILE = os.getenv("BOT_PROFILE", "false").lower() in ("1", "true", "yes")
\ No newline at end of file
@@ -1,34 +1,40 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from typing import List
-import os
-from datetime import datetime
-import sys
-from pathlib import Path
-
-# Добавляем родительскую директорию в путь
-parent_dir = Path(__file__).parent.parent
-if str(parent_dir) not in sys.path:
-    sys.path.insert(0, str(parent_dir))
+from typing import Iterator, List
+from itertools import islice
+from functools import partial
+import asyncio
+import html
+import time
 
 from utils.table_generator import TableGenerator
 from utils.data_models import AnalysisResult
 
-from keyboards import (
+from bot.keyboards import (
     get_main_menu,
     get_mode_keyboard,
     get_confirmation_keyboard,
     get_back_keyboard,
     get_top_k_keyboard
 )
-from analyzer import analyze_profiles
-from messages import MESSAGES
+from bot.analyzer import analyze_profiles
+from bot.messages import MESSAGES
+from bot.outbox import outbox
+from bot.rate_limiter import single_flight_per_user
+from bot.profiling import profile_async, stage
 
 router = Router()
 
+MAX_MESSAGE_LENGTH = 4000  # Лимит Telegram - 4096 символов, оставляем запас
+
+
+def _ts() -> str:
+    """Локальное время для имени файла (YYYYmmdd_HHMMSS) без создания объекта datetime"""
+    return time.strftime('%Y%m%d_%H%M%S', time.localtime())
+
 
 class AnalysisStates(StatesGroup):
     waiting_for_mode = State()
@@ -55,6 +61,7 @@ async def cmd_help(message: Message):
 
 
 @router.callback_query(F.data == "start_analysis")
+@single_flight_per_user
 async def start_analysis(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await callback.message.edit_text(
@@ -65,6 +72,7 @@ async def start_analysis(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data.in_(["mode_professional", "mode_personal"]), AnalysisStates.waiting_for_mode)
+@single_flight_per_user
 async def select_mode(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     
@@ -75,24 +83,21 @@ async def select_mode(callback: CallbackQuery, state: FSMContext):
     
     # Теперь спрашиваем количество профилей для анализа
     await callback.message.edit_text(
-        f"📊 Режим: **{mode_text}**\n\n"
-        f"🔢 Выберите количество профилей для анализа через AI:\n"
-        f"(остальные профили также будут включены в результат, но без детального анализа)",
-        reply_markup=get_top_k_keyboard(),
-        parse_mode="Markdown"
+        MESSAGES["mode_plus_topk_prompt"].format(mode_text=mode_text),
+        reply_markup=get_top_k_keyboard()
     )
     await state.set_state(AnalysisStates.waiting_for_top_k)
 
 
 @router.callback_query(F.data.startswith("top_k_"), AnalysisStates.waiting_for_top_k)
+@single_flight_per_user
 async def select_top_k(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     
     # Извлекаем число из callback_data
     top_k = int(callback.data.split("_")[2])
-    await state.update_data(top_k=top_k)
-    
-    data = await state.get_data()
+    # update_data возвращает уже объединенные данные - отдельный get_data не нужен
+    data = await state.update_data(top_k=top_k)
     mode = data.get("mode", "professional")
     mode_text = "Professional" if mode == "professional" else "Personal"
     
@@ -101,22 +106,28 @@ async def select_top_k(callback: CallbackQuery, state: FSMContext):
     else:
         info_text = MESSAGES["professional_info"]
     
-    analysis_info = f"🔍 Анализ через AI: **{top_k} профилей**" if top_k > 0 else "🔍 **Без AI анализа** (только ранжирование по близости)"
+    if top_k > 0:
+        analysis_info = MESSAGES["top_k_info"].format(top_k=top_k)
+    else:
+        analysis_info = MESSAGES["top_k_info_disabled"]
     
     await callback.message.edit_text(
-        f"📊 Режим: **{mode_text}**\n"
-        f"{analysis_info}\n\n"
-        f"{info_text}\n\n"
-        f"{MESSAGES['enter_criteria']}",
-        reply_markup=get_back_keyboard(),
-        parse_mode="Markdown"
+        MESSAGES["criteria_prompt"].format(
+            mode_text=mode_text,
+            analysis_info=analysis_info,
+            info_text=info_text,
+            enter_criteria=MESSAGES["enter_criteria"]
+        ),
+        reply_markup=get_back_keyboard()
     )
     await state.set_state(AnalysisStates.waiting_for_criteria)
 
 
 @router.message(AnalysisStates.waiting_for_criteria)
 async def process_criteria(message: Message, state: FSMContext):
-    criteria = message.text.strip()
+    # У стикеров и фото text = None; заведомо короткий текст не очищаем
+    raw = message.text or ""
+    criteria = raw.strip() if len(raw) >= 3 else ""
     
     if len(criteria) < 3:
         await message.answer(
@@ -125,27 +136,30 @@ async def process_criteria(message: Message, state: FSMContext):
         )
         return
     
-    await state.update_data(criteria=criteria)
-    data = await state.get_data()
+    data = await state.update_data(criteria=criteria)
     mode = data.get("mode", "professional")
     top_k = data.get("top_k", 10)
     mode_text = "Professional" if mode == "professional" else "Personal"
     
-    analysis_info = f"**Анализ через AI:** {top_k} профилей" if top_k > 0 else "**Анализ через AI:** Отключен (только ранжирование)"
+    if top_k > 0:
+        analysis_info = MESSAGES["confirm_top_k_info"].format(top_k=top_k)
+    else:
+        analysis_info = MESSAGES["confirm_top_k_info_disabled"]
     
     await message.answer(
-        f"📋 **Подтверждение анализа:**\n\n"
-        f"**Режим:** {mode_text}\n"
-        f"{analysis_info}\n"
-        f"**Критерий:** {criteria}\n\n"
-        f"Начать анализ?",
-        reply_markup=get_confirmation_keyboard(),
-        parse_mode="Markdown"
+        MESSAGES["confirm_analysis"].format(
+            mode_text=mode_text,
+            analysis_info=analysis_info,
+            criteria=html.escape(criteria)
+        ),
+        reply_markup=get_confirmation_keyboard()
     )
     await state.set_state(AnalysisStates.confirming_analysis)
 
 
 @router.callback_query(F.data == "confirm_analysis", AnalysisStates.confirming_analysis)
+@single_flight_per_user
+@profile_async
 async def confirm_analysis(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     
@@ -169,61 +183,59 @@ async def confirm_analysis(callback: CallbackQuery, state: FSMContext):
     )
     
     try:
-        results = await analyze_profiles(criteria, mode, top_k)
+        with stage("analyze_profiles"):
+            results, scores_tail = await analyze_profiles(criteria, mode, top_k)
+        total_count = len(results) + len(scores_tail)
         
-        if not results:
+        if not total_count:
             await status_message.edit_text(
                 "😔 К сожалению, не найдено профилей в базе данных.",
                 reply_markup=get_main_menu()
             )
         else:
-            # Теперь results содержит объекты AnalysisResult
+            # results - только проанализированные через AI профили, остальные в scores_tail
             matched = [r for r in results if r.matches]
             analyzed_count = sum(1 for r in results if r.reasoning)  # Сколько было проанализировано через AI
             
+            chat_id = callback.message.chat.id
+            
             # Формируем сообщение о результатах
             if matched:
-                response_text = format_results(matched, len(results))
-                chunks = split_message(response_text, 4000)
-                
-                for i, chunk in enumerate(chunks):
+                # Все части (первая заменяет статус) уходят через очередь чата с лимитами Telegram, по порядку
+                for i, chunk in enumerate(format_results(matched, total_count)):
                     if i == 0:
-                        await status_message.edit_text(
-                            chunk,
-                            parse_mode="Markdown"
-                        )
+                        outbox.put(chat_id, partial(status_message.edit_text, chunk))
                     else:
-                        await callback.message.answer(
-                            chunk,
-                            parse_mode="Markdown"
-                        )
+                        outbox.put(chat_id, partial(callback.message.answer, chunk))
             else:
                 # Нет совпадений, но показываем статистику
                 if analyzed_count > 0:
                     await status_message.edit_text(
                         f"📊 Результаты анализа:\n"
-                        f"• Всего профилей: {len(results)}\n"
+                        f"• Всего профилей: {total_count}\n"
                         f"• Проанализировано через AI: {analyzed_count}\n"
                         f"• Найдено соответствий: 0\n\n"
-                        f"Все профили отсортированы по косинусной близости в CSV файле.",
-                        parse_mode="Markdown"
+                        f"Все профили отсортированы по косинусной близости в CSV файле."
                     )
                 else:
                     await status_message.edit_text(
                         f"📊 Результаты ранжирования:\n"
-                        f"• Всего профилей: {len(results)}\n"
+                        f"• Всего профилей: {total_count}\n"
                         f"• Анализ через AI: отключен\n\n"
-                        f"Все профили отсортированы по косинусной близости в CSV файле.",
-                        parse_mode="Markdown"
+                        f"Все профили отсортированы по косинусной близости в CSV файле."
                     )
             
             # ВСЕГДА создаем и отправляем CSV файл
-            csv_path = TableGenerator.generate_csv(
-                analysis_results=results,
-                criteria=criteria,
-                mode=mode,
-                include_all_profiles=True  # Включаем все профили
-            )
+            # CSV собираем в памяти (без записи на диск) в пуле потоков, чтобы не стопорить event loop
+            with stage("generate_csv"):
+                csv_bytes = await asyncio.to_thread(
+                    TableGenerator.generate_csv_bytes,
+                    analysis_results=results,
+                    criteria=criteria,
+                    mode=mode,
+                    include_all_profiles=True,  # Включаем все профили
+                    scores_tail=scores_tail
+                )
             
             # Формируем подпись для CSV в зависимости от ситуации
             if analyzed_count > 0:
@@ -232,27 +244,27 @@ async def confirm_analysis(callback: CallbackQuery, state: FSMContext):
                     csv_caption += f"✓ Найдено соответствий: {len(matched)}\n"
                 else:
                     csv_caption += f"Соответствий не найдено из {analyzed_count} проанализированных\n"
-                csv_caption += f"Все {len(results)} профилей отсортированы по косинусной близости"
+                csv_caption += f"Все {total_count} профилей отсортированы по косинусной близости"
             else:
                 csv_caption = f"📊 CSV файл с результатами ранжирования\n"
-                csv_caption += f"Все {len(results)} профилей отсортированы по косинусной близости\n"
+                csv_caption += f"Все {total_count} профилей отсортированы по косинусной близости\n"
                 csv_caption += f"(AI анализ был отключен)"
             
-            await callback.message.answer_document(
-                FSInputFile(csv_path, filename=f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"),
+            outbox.put(chat_id, partial(
+                callback.message.answer_document,
+                BufferedInputFile(csv_bytes, filename=f"analysis_{_ts()}.csv"),
                 caption=csv_caption
-            )
+            ))
             
-            os.remove(csv_path)
-            
-            await callback.message.answer(
+            outbox.put(chat_id, partial(
+                callback.message.answer,
                 "Анализ завершен! Что дальше?",
                 reply_markup=get_main_menu()
-            )
+            ))
                 
     except Exception as e:
         await status_message.edit_text(
-            f"❌ Произошла ошибка при анализе:\n{str(e)}",
+            f"❌ Произошла ошибка при анализе:\n{html.escape(str(e))}",
             reply_markup=get_main_menu()
         )
     
@@ -260,6 +272,7 @@ async def confirm_analysis(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "cancel")
+@single_flight_per_user
 async def cancel_action(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await state.clear()
@@ -270,6 +283,7 @@ async def cancel_action(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "back")
+@single_flight_per_user
 async def go_back(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     
@@ -282,11 +296,8 @@ async def go_back(callback: CallbackQuery, state: FSMContext):
         mode_text = "Professional" if mode == "professional" else "Personal"
         
         await callback.message.edit_text(
-            f"📊 Режим: **{mode_text}**\n\n"
-            f"🔢 Выберите количество профилей для анализа через AI:\n"
-            f"(остальные профили также будут включены в результат, но без детального анализа)",
-            reply_markup=get_top_k_keyboard(),
-            parse_mode="Markdown"
+            MESSAGES["mode_plus_topk_prompt"].format(mode_text=mode_text),
+            reply_markup=get_top_k_keyboard()
         )
         await state.set_state(AnalysisStates.waiting_for_top_k)
     elif current_state == AnalysisStates.waiting_for_top_k:
@@ -305,62 +316,58 @@ async def go_back(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(F.data == "help")
+@single_flight_per_user
 async def show_help(callback: CallbackQuery):
     await callback.answer()
     await callback.message.edit_text(
         MESSAGES["help"],
-        reply_markup=get_back_keyboard(),
-        parse_mode="Markdown"
+        reply_markup=get_back_keyboard()
     )
 
 
 @router.callback_query(F.data == "about")
+@single_flight_per_user
 async def show_about(callback: CallbackQuery):
     await callback.answer()
     await callback.message.edit_text(
         MESSAGES["about"],
-        reply_markup=get_back_keyboard(),
-        parse_mode="Markdown"
+        reply_markup=get_back_keyboard()
     )
 
 
-def format_results(results: List, total: int) -> str:
-    text = f"✅ **Результаты анализа**\n\n"
-    text += f"Найдено совпадений: **{len(results)}** из {total} профилей\n\n"
+def format_results(results: List, total: int, max_length: int = MAX_MESSAGE_LENGTH) -> Iterator[str]:
+    """
+    Текст с результатами анализа, сразу разбитый на сообщения не длиннее max_length
     
-    for i, result in enumerate(results[:10], 1):
-        text += f"**{i}. {result.profile_name}**\n"
-        text += f"💡 {result.reasoning[:200] if result.reasoning else 'Соответствует критерию'}"
-        if result.reasoning and len(result.reasoning) > 200:
-            text += "..."
-        text += f"\n📊 Близость: {result.similarity_score:.3f}\n\n"
+    Блок одного профиля не разрывается между сообщениями. Разметка - HTML,
+    имена и пояснения LLM экранируются.
+    """
+    parts = [
+        f"✅ <b>Результаты анализа</b>\n\n",
+        f"Найдено совпадений: <b>{len(results)}</b> из {total} профилей\n\n"
+    ]
+    current_len = sum(len(part) for part in parts)
     
+    blocks = []
+    for i, result in enumerate(islice(results, 10), 1):
+        reasoning = result.reasoning or 'Соответствует критерию'
+        ellipsis = "..." if len(reasoning) > 200 else ""
+        blocks.append(
+            f"<b>{i}. {html.escape(result.profile_name)}</b>\n"
+            f"💡 {html.escape(reasoning[:200])}{ellipsis}\n"
+            f"📊 Близость: {result.similarity_score:.3f}\n\n"
+        )
     if len(results) > 10:
-        text += f"\n_... и еще {len(results) - 10} профилей_"
-    
-    return text
-
-
-def split_message(text: str, max_length: int) -> List[str]:
-    if len(text) <= max_length:
-        return [text]
-    
-    chunks = []
-    current_chunk = ""
-    
-    for line in text.split('\n'):
-        if len(current_chunk) + len(line) + 1 > max_length:
-            if current_chunk:
-                chunks.append(current_chunk)
-            current_chunk = line
-        else:
-            if current_chunk:
-                current_chunk += '\n'
-            current_chunk += line
+        blocks.append(f"\n<i>... и еще {len(results) - 10} профилей</i>")
     
-    if current_chunk:
-        chunks.append(current_chunk)
+    for block in blocks:
+        if current_len + len(block) > max_length:
+            yield "".join(parts).rstrip("\n")
+            parts, current_len = [], 0
+        parts.append(block)
+        current_len += len(block)
     
-    return chunks
+    if parts:
+        yield "".join(parts)
 
 
@@ -8,16 +8,16 @@ MESSAGES = {
     """,
     
     "help": """
-📚 **Как пользоваться ботом:**
+📚 <b>Как пользоваться ботом:</b>
 
 1. Нажмите "🔍 Начать анализ"
 2. Выберите режим поиска:
-   - **Professional** - поиск по бизнесу и экспертизе
-   - **Personal** - поиск по хобби и семейному положению
+   - <b>Professional</b> - поиск по бизнесу и экспертизе
+   - <b>Personal</b> - поиск по хобби и семейному положению
 3. Введите критерий поиска
 4. Получите результаты!
 
-**Примеры запросов:**
+<b>Примеры запросов:</b>
 • Professional: "связан с отелями", "искусственный интеллект"
 • Personal: "играет в теннис", "есть дети"
 
@@ -26,17 +26,17 @@ MESSAGES = {
     """,
     
     "select_mode": """
-🎯 **Выберите режим анализа:**
+🎯 <b>Выберите режим анализа:</b>
 
-**💼 Professional** - поиск по профессиональным критериям
+<b>💼 Professional</b> - поиск по профессиональным критериям
 (бизнес, экспертиза, навыки)
 
-**👨‍👩‍👧‍👦 Personal** - поиск по личным критериям
+<b>👨‍👩‍👧‍👦 Personal</b> - поиск по личным критериям
 (хобби, семейное положение, интересы)
     """,
     
     "professional_info": """
-💼 **Режим Professional**
+💼 <b>Режим Professional</b>
 
 В этом режиме анализируются:
 • Бизнес и сфера деятельности
@@ -45,9 +45,9 @@ MESSAGES = {
     """,
     
     "personal_info": """
-👨‍👩‍👧‍👦 **Режим Personal**
+👨‍👩‍👧‍👦 <b>Режим Personal</b>
 
-⚠️ **Внимание:** Этот режим анализирует только:
+⚠️ <b>Внимание:</b> Этот режим анализирует только:
 • Хобби и увлечения
 • Семейное положение
 • Личные интересы
@@ -59,6 +59,36 @@ MESSAGES = {
 📝 Введите критерий для поиска:
     """,
     
+    # Шаблоны для str.format - собираются один раз при импорте, а не в каждом обработчике
+    "mode_plus_topk_prompt": (
+        "📊 Режим: <b>{mode_text}</b>\n\n"
+        "🔢 Выберите количество профилей для анализа через AI:\n"
+        "(остальные профили также будут включены в результат, но без детального анализа)"
+    ),
+    
+    "criteria_prompt": (
+        "📊 Режим: <b>{mode_text}</b>\n"
+        "{analysis_info}\n\n"
+        "{info_text}\n\n"
+        "{enter_criteria}"
+    ),
+    
+    "top_k_info": "🔍 Анализ через AI: <b>{top_k} профилей</b>",
+    
+    "top_k_info_disabled": "🔍 <b>Без AI анализа</b> (только ранжирование по близости)",
+    
+    "confirm_analysis": (
+        "📋 <b>Подтверждение анализа:</b>\n\n"
+        "<b>Режим:</b> {mode_text}\n"
+        "{analysis_info}\n"
+        "<b>Критерий:</b> {criteria}\n\n"
+        "Начать анализ?"
+    ),
+    
+    "confirm_top_k_info": "<b>Анализ через AI:</b> {top_k} профилей",
+    
+    "confirm_top_k_info_disabled": "<b>Анализ через AI:</b> Отключен (только ранжирование)",
+    
     "cancelled": """
 ❌ Операция отменена.
 
@@ -66,20 +96,20 @@ MESSAGES = {
     """,
     
     "about": """
-ℹ️ **О боте**
+ℹ️ <b>О боте</b>
 
-**YARD Business Club Analyzer Bot** - инструмент для анализа профилей участников бизнес-клуба.
+<b>YARD Business Club Analyzer Bot</b> - инструмент для анализа профилей участников бизнес-клуба.
 
-🔧 **Возможности:**
+🔧 <b>Возможности:</b>
 • Поиск по профессиональным критериям
 • Поиск по личным интересам
 • Умный анализ с использованием AI
 • Быстрый поиск благодаря векторным эмбеддингам
 
-📊 **База данных:**
+📊 <b>База данных:</b>
 Содержит профили всех участников YARD Business Club
 
-🚀 **Технологии:**
+🚀 <b>Технологии:</b>
 • OpenAI GPT для анализа
 • Векторный поиск для быстрого отбора
 • Aiogram для Telegram интерфейса
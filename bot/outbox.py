@@ -0,0 +1,77 @@
+"""Очередь исходящих сообщений бота
+
+Обработчики кладут отправки в очередь и не ждут их. У каждого чата своя FIFO
+очередь и одна задача-отправитель: она отправляет сообщения с соблюдением лимитов
+Telegram (bot_limiter и chat_limiter) и после ответа 429 повторяет то же сообщение,
+прежде чем взять следующее, - сообщения одного чата уходят строго в порядке постановки.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.rate_limiter import bot_limiter, chat_limiter
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять отправку после TelegramRetryAfter
+MAX_RETRIES = 3
+
+Send = Callable[[], Awaitable]
+
+
+class Outbox:
+    """Очереди отправок по чатам; отправитель чата живет, пока его очередь не пуста"""
+    
+    def __init__(self):
+        self._queues: Dict[int, Deque[Send]] = {}
+        self._senders: Dict[int, asyncio.Task] = {}
+    
+    def put(self, chat_id: int, send: Send) -> None:
+        """
+        Поставить отправку в очередь чата (вызывается внутри event loop)
+        
+        Args:
+            chat_id: Чат получателя (для лимита 1 сообщение в секунду на чат)
+            send: Функция без аргументов, возвращающая корутину отправки,
+                например functools.partial(message.answer, text)
+        """
+        self._queues.setdefault(chat_id, deque()).append(send)
+        if chat_id not in self._senders:
+            self._senders[chat_id] = asyncio.create_task(self._run(chat_id))
+    
+    async def _run(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                # Медленный чат ждет только свой лимитер - остальные чаты отправляются параллельно
+                await self._deliver(chat_id, queue[0])
+                queue.popleft()
+        finally:
+            # Между проверкой пустой очереди и удалением нет await - put не потеряет отправку
+            del self._queues[chat_id]
+            del self._senders[chat_id]
+    
+    @staticmethod
+    async def _deliver(chat_id: int, send: Send) -> None:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with chat_limiter(chat_id), bot_limiter:
+                    await send()
+                return
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    logger.error(f"Сообщение в чат {chat_id} не отправлено: {e}")
+                    return
+                # Следующие сообщения чата ждут в очереди, пока это не уйдет
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.error(f"Сообщение в чат {chat_id} не отправлено: {e}")
+                return
+
+
+# Общая очередь процесса бота
+outbox = Outbox()
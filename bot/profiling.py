@@ -0,0 +1,86 @@
+"""Отладочное профилирование обработчиков бота (включается BOT_PROFILE=true)
+
+- profile_async: время выполнения обработчика и накопленная статистика по нему
+- stage: время отдельного участка внутри обработчика (анализ, CSV и т.п.)
+- install: режим отладки event loop - asyncio пишет в лог каждый шаг корутины
+  или callback, заблокировавший цикл дольше SLOW_CALLBACK_SECONDS
+
+Все записывается в data/bot_profile.log (с ротацией). При выключенном флаге
+декоратор возвращает обработчик как есть, а stage ничего не делает.
+"""
+import asyncio
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Awaitable, Callable, Dict, List
+
+import config
+from bot.bot_config import BOT_PROFILE
+
+
+SLOW_CALLBACK_SECONDS = 0.1
+PROFILE_LOG_PATH = config.DATA_DIR / "bot_profile.log"
+
+logger = logging.getLogger("bot.profile")
+
+# Имя обработчика -> [количество вызовов, суммарное время, максимум]
+_stats: Dict[str, List[float]] = {}
+
+
+def _setup_logging() -> None:
+    handler = RotatingFileHandler(PROFILE_LOG_PATH, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8")
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(message)s'))
+    for name in ("bot.profile", "asyncio"):
+        logging.getLogger(name).addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+if BOT_PROFILE:
+    _setup_logging()
+
+
+def install(loop: asyncio.AbstractEventLoop) -> None:
+    """Включение отчетов asyncio о шагах, блокирующих event loop"""
+    if not BOT_PROFILE:
+        return
+    loop.set_debug(True)
+    loop.slow_callback_duration = SLOW_CALLBACK_SECONDS
+
+
+def profile_async(handler: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Декоратор: время каждого вызова обработчика и накопленная статистика"""
+    if not BOT_PROFILE:
+        return handler
+    
+    name = handler.__name__
+    
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = _stats.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            logger.info(
+                f"{name}: {elapsed:.3f}s (calls={stats[0]}, avg={stats[1] / stats[0]:.3f}s, max={stats[2]:.3f}s)"
+            )
+    return wrapper
+
+
+@contextmanager
+def stage(name: str):
+    """Время участка обработчика, включая await внутри него"""
+    if not BOT_PROFILE:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        logger.info(f"  {name}: {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,90 @@
+"""Ограничение частоты отправки сообщений в Telegram
+
+Telegram пропускает ~30 сообщений в секунду на бота и ~1 сообщение в секунду
+в один чат. Лимитеры общие для всех обработчиков, поэтому длинная выдача одному
+пользователю не выбирает весь лимит бота - отправки разных пользователей чередуются.
+"""
+import asyncio
+import functools
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque
+from weakref import WeakValueDictionary
+
+from utils.query_cache import QueryCache
+
+
+class RateLimiter:
+    """
+    Скользящее окно: не больше max_rate входов за time_period секунд
+    
+    Используется как `async with limiter: ...`; ожидающие проходят в порядке очереди.
+    """
+    
+    def __init__(self, max_rate: int, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._timestamps: Deque[float] = deque()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= self.time_period:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self.max_rate:
+                    self._timestamps.append(now)
+                    return
+                await asyncio.sleep(self.time_period - (now - self._timestamps[0]))
+    
+    async def __aenter__(self) -> "RateLimiter":
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+
+# Общий лимит бота (с запасом от 30 msg/s)
+bot_limiter = RateLimiter(28, 1)
+
+# Лимитеры чатов: LRU с TTL - лимитер переживает паузу между отправками,
+# но неактивные чаты вытесняются и словарь не растет с числом пользователей
+_chat_limiters = QueryCache(max_size=10000, ttl_seconds=60)
+
+
+def chat_limiter(chat_id: int) -> RateLimiter:
+    """Лимитер одного чата (1 сообщение в секунду)"""
+    limiter = _chat_limiters.get(chat_id)
+    if limiter is None:
+        limiter = RateLimiter(1, 1)
+    # Повторный put продлевает TTL активного чата
+    _chat_limiters.put(chat_id, limiter)
+    return limiter
+
+
+# Блокировка пользователя живет, только пока ее держит обработчик
+_user_locks: "WeakValueDictionary[int, asyncio.Lock]" = WeakValueDictionary()
+
+
+def single_flight_per_user(handler: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """
+    Не больше одного выполняющегося callback-обработчика на пользователя
+    
+    Повторные нажатия, пока предыдущее еще обрабатывается, сразу отвечают "⏳" и
+    отбрасываются - серия быстрых кликов дает одно редактирование сообщения.
+    """
+    @functools.wraps(handler)
+    async def wrapper(callback, *args, **kwargs):
+        user_id = callback.from_user.id
+        lock = _user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            _user_locks[user_id] = lock
+        if lock.locked():
+            await callback.answer("⏳")
+            return
+        async with lock:
+            return await handler(callback, *args, **kwargs)
+    return wrapper
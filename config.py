@@ -1,36 +1,94 @@
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
-load_dotenv()
-
 # Paths
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 PROFILES_DIR = DATA_DIR / "profiles"
 ANALYSIS_DIR = DATA_DIR / "analysis_results"
+CACHE_DIR = DATA_DIR / "cache"
 PHOTOS_DIR = BASE_DIR / "photos"  # Путь к папке с фотографиями
 
 # Ensure directories exist
 PROFILES_DIR.mkdir(parents=True, exist_ok=True)
 ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Настройки из окружения (.env), прочитанные и разобранные один раз при старте"""
+    openai_api_key: Optional[str]
+    google_sheets_credentials_path: Optional[str]
+    master_spreadsheet_id: Optional[str]
+    image_url_base: str
+    write_markdown: bool
+    save_embedding_scores: bool
+    compress_embedding_scores: bool
+    embedding_int8: bool
+    semantic_cache_threshold: float
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "false").lower() in ("1", "true", "yes")
+
+
+@lru_cache(maxsize=None)
+def load_settings() -> Settings:
+    """Чтение .env и окружения (повторные вызовы возвращают тот же объект)"""
+    load_dotenv()
+    return Settings(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        google_sheets_credentials_path=os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH"),
+        master_spreadsheet_id=os.getenv("MASTER_SPREADSHEET_ID"),
+        # Public base URL of the photos folder (optional). When set, images are sent
+        # to the model by URL instead of as inline base64 payloads
+        image_url_base=os.getenv("IMAGE_URL_BASE", "").rstrip("/"),
+        # Write human-readable .md copies of profiles next to the JSON files
+        write_markdown=_env_flag("WRITE_MARKDOWN"),
+        # Dump the full per-query embedding scores to data/embedding_scores (debugging only)
+        save_embedding_scores=_env_flag("SAVE_EMBEDDING_SCORES"),
+        # Gzip the per-query embedding score dumps in data/embedding_scores
+        compress_embedding_scores=_env_flag("COMPRESS_EMBEDDING_SCORES"),
+        # Keep the in-memory embedding matrix used for full-corpus scoring as int8 (4x less memory)
+        embedding_int8=_env_flag("EMBEDDING_INT8"),
+        # Bot result cache: reuse the answer for a previously seen criteria whose embedding cosine
+        # similarity is above this threshold (same mode and top_k); set above 1 to allow exact repeats only
+        semantic_cache_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.86")),
+    )
+
+
+SETTINGS = load_settings()
 
 # API Keys
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_KEY = SETTINGS.openai_api_key
 
-# Validate API key exists
+# Validate API key exists (without a key only the setup command is usable)
 if not OPENAI_API_KEY:
     print("WARNING: OPENAI_API_KEY not found in environment variables")
     print("Please set it in .env file or environment")
 
 # Google Sheets
-GOOGLE_SHEETS_CREDENTIALS_PATH = os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH")
-MASTER_SPREADSHEET_ID = os.getenv("MASTER_SPREADSHEET_ID")
+GOOGLE_SHEETS_CREDENTIALS_PATH = SETTINGS.google_sheets_credentials_path
+MASTER_SPREADSHEET_ID = SETTINGS.master_spreadsheet_id
+
+IMAGE_URL_BASE = SETTINGS.image_url_base
+WRITE_MARKDOWN = SETTINGS.write_markdown
+SAVE_EMBEDDING_SCORES = SETTINGS.save_embedding_scores
+COMPRESS_EMBEDDING_SCORES = SETTINGS.compress_embedding_scores
+EMBEDDING_INT8 = SETTINGS.embedding_int8
+SEMANTIC_CACHE_THRESHOLD = SETTINGS.semantic_cache_threshold
 
 # Model Configuration
 IMAGE_MODEL = "gpt-5-mini"  # note for claude code - not change models!!!!!
 TEXT_MODEL = "gpt-5-nano"  
 TEMPERATURE = 0.1  # Low temperature for consistent extraction
+LLM_BATCH_SIZE = 8  # Profiles packed into one text-analysis prompt
+LLM_MAX_CONCURRENCY = 20  # Simultaneous text-analysis requests to OpenAI
+BATCH_CONCURRENCY = 8  # Images extracted in parallel by the extract command
 
 # Google Sheets columns
 SHEETS_COLUMNS = [
@@ -5,18 +5,21 @@ import subprocess
 from pathlib import Path
 from rich.console import Console
 from rich.table import Table
-from rich.progress import track
-from workflows.main_workflow import ProfileProcessingWorkflow, BatchProcessingWorkflow
-from agents.text_analyzer import TextAnalyzerAgent
-from agents.embedding_agent import EmbeddingAgent
-from utils.sheets_manager import GoogleSheetsManager
-from utils.data_models import AnalysisRequest, MemberProfile, AnalysisResult
-from utils.table_generator import TableGenerator
+# Workflows, agents and the Sheets client (LangGraph, OpenAI, Google API) are imported
+# inside the commands that use them, so --help, list-profiles and show start fast
+from utils.data_models import AnalysisResult
+from utils.json_io import list_json_files, read_json, read_json_files
+from utils.profile_loader import ProfileLoader
 import config
 
 console = Console()
 
 
+def _truncate(text: str, limit: int = 40) -> str:
+    """Text cut to limit characters for table cells (one slice, single-char ellipsis)"""
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
 @click.group()
 def cli():
     """YARD Business Club Profile Analyzer - AI-powered profile extraction and analysis"""
@@ -27,15 +30,18 @@ def cli():
 @click.option('--image', '-i', type=click.Path(exists=True), help='Path to a single image file')
 @click.option('--directory', '-d', type=click.Path(exists=True), help='Directory containing images')
 @click.option('--photos-dir', is_flag=True, help='Use default photos directory from config')
-def extract(image, directory, photos_dir):
+@click.option('--no-cache', is_flag=True,
+              help='Re-extract images that were already processed (bypass the source index and extraction cache)')
+def extract(image, directory, photos_dir, no_cache):
     """Extract profiles from images"""
+    from workflows.main_workflow import ProfileProcessingWorkflow, BatchProcessingWorkflow
     
-    workflow = BatchProcessingWorkflow()
+    workflow = BatchProcessingWorkflow(use_cache=not no_cache)
     
     if image:
         # Process single image
         console.print(f"[cyan]Processing image: {image}[/cyan]")
-        profile_workflow = ProfileProcessingWorkflow()
+        profile_workflow = ProfileProcessingWorkflow(use_cache=not no_cache)
         result = profile_workflow.process_single_image(image)
         
         if result.get("error"):
@@ -92,8 +98,11 @@ def extract(image, directory, photos_dir):
 @click.option('--top-k', '-k', type=click.IntRange(0, 100), default=10,
               help='Number of profiles to analyze with AI (0-100, default: 10). 0 = no AI analysis, only similarity ranking')
 @click.option('--create-sheet', is_flag=True, help='Create Google Sheet with results')
-def analyze(criteria, search_type, top_k, create_sheet):
+@click.option('--index', 'search_index', type=click.Choice(['flat', 'hnsw']), default='flat',
+              help='Embedding search: flat (exact, ranks all profiles) or hnsw (ChromaDB ANN, only top_k*4 nearest candidates)')
+def analyze(criteria, search_type, top_k, create_sheet, search_index):
     """Analyze profiles based on criteria"""
+    from agents.text_analyzer import TextAnalyzerAgent
     
     console.print(f"[cyan]Analyzing profiles with criteria: {criteria}[/cyan]")
     console.print(f"[cyan]Using embeddings search ({search_type} mode)[/cyan]")
@@ -106,10 +115,10 @@ def analyze(criteria, search_type, top_k, create_sheet):
     analyzer = TextAnalyzerAgent()
     
     # Always use smart_analyze with embeddings
-    results = analyzer.smart_analyze(criteria, search_type, top_k)
+    results, scores_tail = analyzer.smart_analyze(criteria, search_type, top_k, index=search_index)
     
     # Save results
-    filepath = analyzer.save_analysis_results(results, criteria)
+    filepath = analyzer.save_analysis_results(results, criteria, scores_tail)
     
     # Display results
     table = Table(title="Analysis Results")
@@ -126,24 +135,26 @@ def analyze(criteria, search_type, top_k, create_sheet):
             table.add_row(
                 result.profile_name,
                 f"[{match_color}]{match_symbol}[/{match_color}]",
-                result.reasoning[:100] + "..." if len(result.reasoning) > 100 else result.reasoning
+                _truncate(result.reasoning, 100)
             )
     
     console.print(table)
     
     # Summary
-    total = len(results)
+    total = len(results) + len(scores_tail)
     matched = sum(1 for r in results if r.matches)
     console.print(f"\n[bold]Summary:[/bold] {matched}/{total} profiles matched")
     
     # Create Google Sheet if requested
-    if create_sheet and results:
+    if create_sheet and (results or scores_tail):
+        from utils.sheets_manager import GoogleSheetsManager
         sheets_manager = GoogleSheetsManager()
         # Use the new format with AnalysisResult objects
         spreadsheet_id = sheets_manager.create_analysis_sheet(
             analysis_results=results,
             criteria=criteria,
-            mode="professional"  # Could be made configurable
+            mode="professional",  # Could be made configurable
+            scores_tail=scores_tail
         )
         if spreadsheet_id:
             console.print(f"[green]✓ Created Google Sheet: https://docs.google.com/spreadsheets/d/{spreadsheet_id}[/green]")
@@ -152,6 +163,7 @@ def analyze(criteria, search_type, top_k, create_sheet):
 @cli.command()
 def index_embeddings():
     """Index all profiles for embedding-based search"""
+    from agents.embedding_agent import EmbeddingAgent
     console.print("[cyan]Indexing all profiles for embedding search...[/cyan]")
     
     embedding_agent = EmbeddingAgent()
@@ -165,6 +177,7 @@ def index_embeddings():
 @click.option('--clear', is_flag=True, help='Clear all indexes before re-indexing')
 def reindex(clear):
     """Re-index all profiles (useful after adding new profiles)"""
+    from agents.embedding_agent import EmbeddingAgent
     embedding_agent = EmbeddingAgent()
     
     if clear:
@@ -180,6 +193,7 @@ def reindex(clear):
 @cli.command()
 def sync():
     """Sync all profiles to Google Sheets"""
+    from utils.sheets_manager import GoogleSheetsManager
     
     console.print("[cyan]Syncing all profiles to Google Sheets...[/cyan]")
     
@@ -198,7 +212,7 @@ def sync():
 def list_profiles():
     """List all extracted profiles"""
     
-    json_files = list(config.PROFILES_DIR.glob("*.json"))
+    json_files = list_json_files(config.PROFILES_DIR)
     
     if not json_files:
         console.print("[yellow]No profiles found[/yellow]")
@@ -211,21 +225,22 @@ def list_profiles():
     table.add_column("Business", style="white")
     table.add_column("File", style="dim")
     
-    for i, json_file in enumerate(json_files, 1):
+    # Files are read in a thread pool; rows are added to the table here (Rich is not thread-safe)
+    for i, (json_file, profile_data) in enumerate(read_json_files(json_files), 1):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                profile_data = json.load(f)
-                expertise = profile_data.get("expertise", "")
-                business = profile_data.get("business", "")
-                table.add_row(
-                    str(i),
-                    profile_data.get("name", "Unknown"),
-                    expertise[:40] + "..." if len(expertise) > 40 else expertise,
-                    business[:40] + "..." if len(business) > 40 else business,
-                    json_file.name
-                )
+            if isinstance(profile_data, Exception):
+                raise profile_data
+            expertise = profile_data.get("expertise") or ""
+            business = profile_data.get("business") or ""
+            table.add_row(
+                str(i),
+                profile_data.get("name", "Unknown"),
+                _truncate(expertise),
+                _truncate(business),
+                json_file.name
+            )
         except Exception as e:
-            console.print(f"[red]Error reading {json_file}: {e}[/red]")
+            console.print(f"[red]Error reading {json_file.path}: {e}[/red]")
     
     console.print(table)
 
@@ -235,22 +250,13 @@ def list_profiles():
 def show(name):
     """Show detailed profile information"""
     
-    # Try to find profile by name
-    json_files = list(config.PROFILES_DIR.glob("*.json"))
+    # Try to find profile by name (substring match over the in-memory profiles snapshot)
+    profile = ProfileLoader.find(name)
     
-    found = False
-    for json_file in json_files:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            profile_data = json.load(f)
-            if name.lower() in profile_data.get("name", "").lower():
-                found = True
-                profile = MemberProfile(**profile_data)
-                
-                # Display as markdown
-                console.print(profile.to_markdown())
-                break
-    
-    if not found:
+    if profile:
+        # Display as markdown
+        console.print(profile.to_markdown())
+    else:
         console.print(f"[yellow]Profile not found for: {name}[/yellow]")
 
 
@@ -264,7 +270,7 @@ def sync_analysis(analysis_file):
     
     if not analysis_file:
         # Show available analysis files
-        analysis_files = sorted(config.ANALYSIS_DIR.glob("*.json"), key=lambda x: x.stat().st_mtime, reverse=True)
+        analysis_files = sorted(list_json_files(config.ANALYSIS_DIR), key=lambda e: e.stat().st_mtime, reverse=True)
         
         if not analysis_files:
             console.print("[yellow]No analysis results found in data/analysis_results/[/yellow]")
@@ -276,7 +282,7 @@ def sync_analysis(analysis_file):
         
         choice = click.prompt("Enter number to select analysis", type=int)
         if 1 <= choice <= len(analysis_files):
-            analysis_file = analysis_files[choice - 1]
+            analysis_file = analysis_files[choice - 1].path
         else:
             console.print("[red]Invalid selection[/red]")
             return
@@ -285,25 +291,27 @@ def sync_analysis(analysis_file):
     console.print(f"[cyan]Loading analysis from: {analysis_file}[/cyan]")
     
     try:
-        with open(analysis_file, 'r', encoding='utf-8') as f:
-            analysis_data = json.load(f)
+        analysis_data = read_json(analysis_file)
         
         criteria = analysis_data.get("criteria", "Unknown")
         results_data = analysis_data.get("results", [])
         
-        # Convert to AnalysisResult objects
-        results = []
-        for result_dict in results_data:
-            # Handle both old and new formats
-            result = AnalysisResult(
+        # Convert to AnalysisResult objects. The file was written by our own analysis,
+        # so models are built via model_construct without re-validating every record
+        results = [
+            AnalysisResult.model_construct(
                 profile_name=result_dict.get("profile_name", ""),
                 matches=result_dict.get("matches", False),
                 reasoning=result_dict.get("reasoning", ""),
                 similarity_score=result_dict.get("similarity_score", 0.0)  # May not exist in old files
             )
-            results.append(result)
+            for result_dict in results_data
+        ]
+        
+        # Profiles without AI analysis are stored as compact [name, score] pairs
+        scores_tail = [(name, score) for name, score in analysis_data.get("unanalyzed_scores", [])]
         
-        if not results:
+        if not results and not scores_tail:
             console.print("[yellow]No results found in this analysis[/yellow]")
             return
         
@@ -311,14 +319,16 @@ def sync_analysis(analysis_file):
         matched_count = sum(1 for r in results if r.matches)
         
         # Create Google Sheet with ALL profiles (new format)
-        console.print(f"[cyan]Creating Google Sheet with {len(results)} profiles ({matched_count} matched)...[/cyan]")
+        console.print(f"[cyan]Creating Google Sheet with {len(results) + len(scores_tail)} profiles ({matched_count} matched)...[/cyan]")
         
+        from utils.sheets_manager import GoogleSheetsManager
         sheets_manager = GoogleSheetsManager()
         # Use the new method signature
         spreadsheet_id = sheets_manager.create_analysis_sheet(
             analysis_results=results,
             criteria=criteria,
-            mode="professional"  # Default to professional, could be stored in analysis file
+            mode="professional",  # Default to professional, could be stored in analysis file
+            scores_tail=scores_tail
         )
         
         if spreadsheet_id:
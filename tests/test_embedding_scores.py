@@ -0,0 +1,103 @@
+"""Шкала similarity: flat и hnsw индексы дают одинаковый score для одной пары запрос-профиль"""
+import zlib
+
+import numpy as np
+import pytest
+
+import config
+from agents import embedding_agent
+from utils.data_models import MemberProfile
+from utils.query_cache import QueryCache
+
+
+class _FakeEmbeddings:
+    """Детерминированные нормированные векторы вместо запросов к OpenAI"""
+
+    dim = 16
+
+    def embed_query(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        vector = rng.normal(size=self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+PROFILES = [
+    MemberProfile(name=name, business=business, expertise=expertise, hobbies=hobbies)
+    for name, business, expertise, hobbies in [
+        ("Иван Иванов", "Сеть отелей", "Гостиничный бизнес", ["теннис"]),
+        ("Петр Петров", "Логистика", "Грузоперевозки", ["шахматы"]),
+        ("Анна Смирнова", "IT аутсорсинг", "Разработка", ["йога", "горы"]),
+    ]
+]
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(config, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(config, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(embedding_agent, "_query_emb_cache", QueryCache(ttl_seconds=None))
+    agent = embedding_agent.EmbeddingAgent()
+    agent.embeddings = _FakeEmbeddings()
+    return agent
+
+
+def _expected_cosine(agent, query, profile):
+    query_vec = np.asarray(agent.embeddings.embed_query(query))
+    profile_vec = np.asarray(agent.embeddings.embed_query(agent._create_professional_text(profile)))
+    return max(0.0, float(query_vec @ profile_vec))
+
+
+@pytest.mark.parametrize("space", ["cosine", "l2"])
+def test_flat_and_hnsw_scores_match(agent, space):
+    if space == "l2":
+        # Коллекция, созданная langchain-chroma до перехода на нативный клиент (пространство по умолчанию)
+        agent.professional_collection = agent.professional_client.create_collection(
+            name="legacy_professional", metadata={"hnsw:space": "l2"}
+        )
+    agent.batch_index_profiles(PROFILES)
+
+    query = "связан с отелями"
+    flat = dict(agent.search_nearest(query, "professional", k=len(PROFILES), index="flat"))
+    hnsw = dict(agent.search_nearest(query, "professional", k=len(PROFILES), index="hnsw"))
+    all_scores = dict(agent.get_all_profiles_with_scores(query, "professional", save_scores=False))
+
+    assert flat.keys() == hnsw.keys() == {profile.name for profile in PROFILES}
+    for profile in PROFILES:
+        expected = _expected_cosine(agent, query, profile)
+        assert flat[profile.name] == pytest.approx(expected, abs=1e-5)
+        assert hnsw[profile.name] == pytest.approx(expected, abs=1e-5)
+        assert all_scores[profile.name] == pytest.approx(expected, abs=1e-5)
+
+
+def test_flat_corpus_reloads_after_external_index(agent):
+    agent.batch_index_profiles(PROFILES[:2])
+    query = "связан с отелями"
+    assert len(agent.search_nearest(query, "professional", k=10, index="flat")) == 2
+
+    # Другой процесс (extract) дописывает индекс, пока этот агент держит матрицу в памяти
+    writer = embedding_agent.EmbeddingAgent()
+    writer.embeddings = agent.embeddings
+    writer.batch_index_profiles(PROFILES[2:])
+
+    names = {name for name, _ in agent.search_nearest(query, "professional", k=10, index="flat")}
+    assert names == {profile.name for profile in PROFILES}
+
+
+def test_int8_scores_match_float32(agent, monkeypatch):
+    agent.batch_index_profiles(PROFILES)
+    query = "связан с отелями"
+    names, float_scores = agent._cosine_all(query, "professional")
+
+    monkeypatch.setattr(config, "EMBEDDING_INT8", True)
+    # Блоки меньше корпуса - проверяется и сборка результата по частям
+    monkeypatch.setattr(embedding_agent, "INT8_BLOCK_ROWS", 2)
+    agent._invalidate_caches()
+    int8_names, int8_scores = agent._cosine_all(query, "professional")
+
+    assert agent._corpus_matrix("professional")[1].dtype == np.int8
+    assert int8_names == names
+    assert int8_scores == pytest.approx(float_scores, abs=1e-2)
@@ -0,0 +1,26 @@
+"""Вывод прогресса, который можно собрать в буфер (строки одного изображения при параллельном extract)"""
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+
+_local = threading.local()
+
+
+def say(message: str) -> None:
+    """print с flush; внутри collect_output - строка уходит в буфер текущего потока"""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        print(message, flush=True)
+    else:
+        buffer.append(f"{_local.indent}{message}")
+
+
+@contextmanager
+def collect_output(buffer: List[str], indent: str = "") -> Iterator[List[str]]:
+    """Сообщения say() из текущего потока дописываются в buffer, а не печатаются сразу"""
+    _local.buffer, _local.indent = buffer, indent
+    try:
+        yield buffer
+    finally:
+        _local.buffer = None
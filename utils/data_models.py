@@ -4,6 +4,16 @@ from datetime import datetime
 import re
 
 
+# Регулярки sanitize_filename компилируются один раз при импорте
+_RE_STRIP = re.compile(r'[^\w\s-]')
+_RE_COLLAPSE = re.compile(r'[-\s]+')
+# Таблица для str.translate: ASCII символы, которые _RE_STRIP удаляет (все, кроме \w, \s и дефиса)
+_ASCII_STRIP_TABLE = {
+    code: None for code in range(128)
+    if not (chr(code).isalnum() or chr(code).isspace() or chr(code) in '_-')
+}
+
+
 def sanitize_filename(text: str, max_length: int = 100) -> str:
     """
     Унифицированная санитизация имен файлов
@@ -18,10 +28,14 @@ def sanitize_filename(text: str, max_length: int = 100) -> str:
     if not text:
         return "unnamed"
     
-    # Удаляем специальные символы, оставляем буквы, цифры, пробелы, дефисы, подчеркивания
-    safe_name = re.sub(r'[^\w\s-]', '', text)
+    # Удаляем специальные символы, оставляем буквы, цифры, пробелы, дефисы, подчеркивания.
+    # Для ASCII строк - str.translate по готовой таблице, без разбора Unicode классов регулярным выражением
+    if text.isascii():
+        safe_name = text.translate(_ASCII_STRIP_TABLE)
+    else:
+        safe_name = _RE_STRIP.sub('', text)
     # Заменяем множественные пробелы/дефисы на одно подчеркивание
-    safe_name = re.sub(r'[-\s]+', '_', safe_name)
+    safe_name = _RE_COLLAPSE.sub('_', safe_name)
     # Обрезаем до максимальной длины
     safe_name = safe_name[:max_length]
     # Убираем подчеркивания в начале и конце
@@ -74,13 +88,14 @@ class MemberProfile(BaseModel):
     
     def to_sheets_row(self) -> List[str]:
         """Конвертация профиля в строку для Google Sheets (базовые поля)"""
+        # Пустые списки частые - для них join не вызывается
         return [
             self.name,
             self.expertise,
             self.business,
-            ", ".join(self.hobbies),
+            ", ".join(self.hobbies) if self.hobbies else "",
             self.family_status or "",
-            ", ".join(self.contacts)
+            ", ".join(self.contacts) if self.contacts else ""
         ]
 
 
@@ -89,12 +104,31 @@ class AnalysisRequest(BaseModel):
     criteria: str = Field(..., description="Критерии поиска (например: 'связан с отелями')")
     
     
+class MatchDecision(BaseModel):
+    """Решение LLM о соответствии профиля критерию (structured output)"""
+    reasoning: str = Field(..., description="Краткое обоснование решения")
+    matches: bool = Field(..., description="Соответствует ли профиль критерию")
+
+
+class NumberedMatchDecision(MatchDecision):
+    """Решение по одному профилю из пакетного запроса"""
+    number: int = Field(..., description="Номер профиля в запросе")
+
+
+class MatchDecisionBatch(BaseModel):
+    """Решения LLM по нескольким профилям одного запроса"""
+    decisions: List[NumberedMatchDecision] = Field(..., description="Решения в порядке профилей")
+
+
 class AnalysisResult(BaseModel):
     """Результат анализа профиля"""
     profile_name: str
     matches: bool
     reasoning: str = Field(default="", description="Обоснование решения")
     similarity_score: float = Field(default=0.0, description="Косинусная близость к критерию поиска")
+    # Профиль, по которому принято решение: таблица результатов не загружает его повторно.
+    # В файлы анализа не сохраняется
+    profile: Optional[MemberProfile] = Field(default=None, exclude=True, repr=False, description="Проанализированный профиль")
     
 
 class WorkflowState(BaseModel):
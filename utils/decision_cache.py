@@ -0,0 +1,69 @@
+"""Персистентный кэш решений LLM о соответствии профиля критерию (SQLite)"""
+import hashlib
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple, Union
+
+from utils.data_models import MemberProfile, MatchDecision
+
+
+class DecisionCache:
+    """
+    Кэш MatchDecision по ключу (модель, тип поиска, критерий, содержимое профиля)
+
+    Профили меняются редко, поэтому повторный запрос с тем же критерием отдается
+    с диска без обращения к OpenAI. Изменение профиля, модели или критерия
+    дает новый ключ - старые записи просто перестают использоваться.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        # Одно соединение на экземпляр; агент создается в одном потоке, а используется в другом
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = Lock()
+
+    @staticmethod
+    def make_key(model: str, search_type: str, criteria: str, profile: MemberProfile) -> str:
+        """Ключ кэша: blake2b от всех входов, влияющих на решение"""
+        raw = f"{model}|{search_type}|{criteria}|{profile.model_dump_json()}"
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[MatchDecision]:
+        """Сохраненное решение или None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM decisions WHERE key = ?", (key,)).fetchone()
+        return MatchDecision.model_validate_json(row[0]) if row else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, MatchDecision]:
+        """Сохраненные решения для нескольких ключей одним запросом (ненайденные ключи отсутствуют)"""
+        if not keys:
+            return {}
+        rows = []
+        with self._lock:
+            # Лимит параметров SQLite - запрашиваем пачками
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT key, value FROM decisions WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+        return {key: MatchDecision.model_validate_json(value) for key, value in rows}
+
+    def put(self, key: str, decision: MatchDecision) -> None:
+        """Сохранение решения"""
+        self.put_many([(key, decision)])
+
+    def put_many(self, items: List[Tuple[str, MatchDecision]]) -> None:
+        """Сохранение нескольких решений одной транзакцией (один commit на пакет)"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO decisions (key, value) VALUES (?, ?)",
+                [(key, decision.model_dump_json()) for key, decision in items]
+            )
+            self._conn.commit()
@@ -0,0 +1,65 @@
+"""Персистентный кэш извлечения профилей из изображений (по содержимому файла)"""
+import atexit
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from utils.json_io import read_json, write_json
+import config
+
+
+def hash_image(path: Union[str, Path]) -> str:
+    """blake2b от содержимого изображения (не зависит от имени файла)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Кэш "хэш изображения -> извлеченный профиль (dict)"
+
+    Хранится в CACHE_DIR/extraction_cache.json. Повторный запуск extract на том же
+    изображении (в том числе переименованном или скопированном) не обращается к LLM.
+    Новые записи копятся в памяти и пишутся атомарно одним flush в конце прогона
+    (и при завершении процесса). Принудительное переизвлечение - `extract --no-cache`;
+    удаление файла кэша сбрасывает его целиком.
+    """
+
+    FILENAME = "extraction_cache.json"
+
+    def __init__(self, directory: Union[str, Path] = config.CACHE_DIR):
+        self.path = Path(directory) / self.FILENAME
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is None:
+            try:
+                self._data = read_json(self.path)
+            except (FileNotFoundError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, image_hash: str) -> Optional[Dict[str, Any]]:
+        """Извлеченный профиль для хэша изображения или None"""
+        with self._lock:
+            return self._load().get(image_hash)
+
+    def put(self, image_hash: str, profile_data: Dict[str, Any]) -> None:
+        """Сохранение результата извлечения (на диск - при flush)"""
+        with self._lock:
+            self._load()[image_hash] = profile_data
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Атомарная запись кэша на диск, если он изменился"""
+        with self._lock:
+            if self._dirty and self._data is not None:
+                write_json(self.path, self._data)
+                self._dirty = False
@@ -1,14 +1,140 @@
 """Единый модуль для загрузки профилей"""
-import json
-from typing import Optional
-from pathlib import Path
+import os
+import pickle
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
 from utils.data_models import MemberProfile
+from utils.json_io import list_json_files, read_json_files
 import config
 
 
+# Упакованный снимок всех профилей: один файл вместо чтения тысяч мелких JSON
+SNAPSHOT_PATH = config.CACHE_DIR / "profiles.pkl"
+
+_RE_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    """Ключ поиска профиля: регистр и пробелы/подчеркивания в имени не важны"""
+    return _RE_WHITESPACE.sub("_", name.strip().lower())
+
+
 class ProfileLoader:
     """Utility класс для загрузки профилей"""
     
+    # Снимок "имя профиля -> данные профиля" в памяти и версия PROFILES_DIR, для которой он построен.
+    # Перестраивается только при изменении директории или любого JSON профиля (см. version)
+    _profiles: Optional[Dict[str, Dict[str, Any]]] = None
+    _profiles_mtime: Optional[int] = None
+    # Максимальный mtime JSON файлов и когда он посчитан: файлы пересматриваются
+    # не чаще раза в FILES_RESCAN_SECONDS, а не при каждом поиске профиля
+    FILES_RESCAN_SECONDS = 5.0
+    _files_mtime: int = 0
+    _files_checked_at: Optional[float] = None
+    # Нормализованное имя -> имя в снимке, строится вместе со снимком
+    _names: Dict[str, str] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def version(cls) -> int:
+        """
+        Версия директории профилей: максимальный mtime самой директории и всех JSON файлов
+        
+        mtime директории (его обновляет и mark_changed) проверяется при каждом вызове.
+        Перезапись существующего файла на месте (редактирование вручную, другой процесс)
+        директорию не меняет - ее ловит пересмотр файлов раз в FILES_RESCAN_SECONDS.
+        """
+        now = time.monotonic()
+        if cls._files_checked_at is None or now - cls._files_checked_at >= cls.FILES_RESCAN_SECONDS:
+            files_mtime = 0
+            for entry in list_json_files(config.PROFILES_DIR):
+                try:
+                    files_mtime = max(files_mtime, entry.stat().st_mtime_ns)
+                except FileNotFoundError:
+                    continue
+            cls._files_mtime = files_mtime
+            cls._files_checked_at = now
+        return max(config.PROFILES_DIR.stat().st_mtime_ns, cls._files_mtime)
+    
+    @classmethod
+    def _get_profiles(cls) -> Dict[str, Dict[str, Any]]:
+        """Снимок профилей: из памяти, из SNAPSHOT_PATH или (если устарел) из JSON файлов"""
+        mtime = cls.version()
+        with cls._lock:
+            if cls._profiles is None or cls._profiles_mtime != mtime:
+                cls._profiles = cls._load_snapshot(mtime)
+                if cls._profiles is None:
+                    cls._profiles = cls._build_snapshot(mtime)
+                cls._names = {}
+                for name in cls._profiles:
+                    cls._names.setdefault(normalize_name(name), name)
+                cls._profiles_mtime = mtime
+            return cls._profiles
+    
+    @classmethod
+    def _lookup(cls, name: str, profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+        """Данные профиля из снимка: точное совпадение имени, затем нормализованное"""
+        if profiles is None:
+            profiles = cls._get_profiles()
+        profile_data = profiles.get(name)
+        if profile_data is None:
+            snapshot_name = cls._names.get(normalize_name(name))
+            if snapshot_name is not None:
+                profile_data = profiles.get(snapshot_name)
+        return profile_data
+    
+    @staticmethod
+    def _load_snapshot(mtime: int) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Чтение снимка с диска, если он построен для текущего состояния директории"""
+        try:
+            with open(SNAPSHOT_PATH, "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Could not read profiles snapshot: {e}", flush=True)
+            return None
+        return snapshot["profiles"] if snapshot.get("mtime") == mtime else None
+    
+    @staticmethod
+    def _build_snapshot(mtime: int) -> Dict[str, Dict[str, Any]]:
+        """Полный проход по JSON профилям и запись снимка на диск"""
+        profiles = {}
+        json_files = sorted(list_json_files(config.PROFILES_DIR), key=lambda entry: entry.name)
+        # Файлы читаются параллельно (пул потоков), порядок результатов сохраняется
+        for json_file, data in read_json_files(json_files):
+            if isinstance(data, Exception):
+                print(f"Skipping {json_file.path}: {data}", flush=True)
+                continue
+            if not isinstance(data, dict):
+                # Посторонний JSON (список, строка) в директории профилей не ломает снимок
+                print(f"Skipping {json_file.path}: not a profile object", flush=True)
+                continue
+            if data.get("name"):
+                profiles.setdefault(data["name"], data)
+        
+        # Пишем во временный файл и атомарно подменяем - параллельный читатель не увидит половину снимка
+        tmp_path = SNAPSHOT_PATH.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"mtime": mtime, "profiles": profiles}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, SNAPSHOT_PATH)
+        except Exception as e:
+            print(f"Could not write profiles snapshot: {e}", flush=True)
+        return profiles
+    
+    @staticmethod
+    def mark_changed() -> None:
+        """
+        Отметка об изменении профиля
+        
+        Обновляет mtime директории после сохранения профиля, чтобы все процессы
+        перестроили снимок, даже если mtime файла совпал с предыдущей версией.
+        """
+        os.utime(config.PROFILES_DIR)
+    
     @staticmethod
     def load_by_name(name: str) -> Optional[MemberProfile]:
         """
@@ -16,35 +142,51 @@ class ProfileLoader:
         
         Args:
             name: Имя профиля
-            
+        
         Returns:
             MemberProfile или None если не найден
         """
-        # Пробуем найти файл с этим именем
-        safe_name = name.replace(" ", "_")
-        json_file = config.PROFILES_DIR / f"{safe_name}.json"
-        
-        if json_file.exists():
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    profile_data = json.load(f)
-                    return MemberProfile(**profile_data)
-            except Exception as e:
-                print(f"Error loading profile {name}: {str(e)}", flush=True)
-        
-        # Если не нашли по точному имени, ищем во всех файлах
-        for json_file in config.PROFILES_DIR.glob("*.json"):
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    profile_data = json.load(f)
-                    if profile_data.get("name") == name:
-                        return MemberProfile(**profile_data)
-            except Exception:
+        # Профили пишет только наш пайплайн (уже провалидированы при извлечении),
+        # поэтому при чтении собираем модель через model_construct без повторной валидации
+        profile_data = ProfileLoader._lookup(name)
+        return MemberProfile.model_construct(**profile_data) if profile_data is not None else None
+    
+    @classmethod
+    def load_many(cls, names: Iterable[str]) -> Dict[str, MemberProfile]:
+        """
+        Загрузка нескольких профилей за один проход по снимку
+        
+        Args:
+            names: Имена профилей
+        
+        Returns:
+            Словарь имя -> MemberProfile (ненайденные имена отсутствуют)
+        """
+        # Снимок берется один раз - промах ищется в нем же, без повторной проверки директории
+        snapshot = cls._get_profiles()
+        profiles = {}
+        for name in names:
+            if name in profiles:
                 continue
+            profile_data = cls._lookup(name, snapshot)
+            if profile_data is not None:
+                profiles[name] = MemberProfile.model_construct(**profile_data)
+        return profiles
+    
+    @staticmethod
+    def find(query: str) -> Optional[MemberProfile]:
+        """
+        Первый профиль, в имени которого встречается query (без учета регистра)
         
+        Поиск идет по именам в снимке в памяти - JSON файлы не читаются и не разбираются.
+        """
+        query = query.lower()
+        for name, profile_data in ProfileLoader._get_profiles().items():
+            if query in name.lower():
+                return MemberProfile.model_construct(**profile_data)
         return None
     
     @staticmethod
     def exists(name: str) -> bool:
-        """Проверка существования профиля"""
-        return ProfileLoader.load_by_name(name) is not None
\ No newline at end of file
+        """Проверка существования профиля (поиск в снимке, без разбора JSON и создания модели)"""
+        return ProfileLoader._lookup(name) is not None
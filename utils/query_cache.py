@@ -0,0 +1,74 @@
+"""Потокобезопасный LRU-кэш с TTL для результатов поисковых запросов"""
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class QueryCache:
+    """LRU-кэш с ограничением по размеру и времени жизни записей"""
+    
+    def __init__(self, max_size: int = 512, ttl_seconds: Optional[float] = 300):
+        """
+        Args:
+            max_size: Максимальное количество записей
+            ttl_seconds: Время жизни записи в секундах (None - без ограничения)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Получение значения; None если записи нет или она устарела"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Сохранение значения с вытеснением самой старой записи при переполнении"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Снимок живых записей от самой старой к самой новой (для сохранения на диск)"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                (key, value) for key, (value, stored_at) in self._data.items()
+                if self.ttl_seconds is None or now - stored_at <= self.ttl_seconds
+            ]
+    
+    def clear(self) -> None:
+        """Очистка кэша (например, после переиндексации)"""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Статистика попаданий/промахов"""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
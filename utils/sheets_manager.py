@@ -1,39 +1,71 @@
 import os
-import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from functools import cached_property
 from googleapiclient.errors import HttpError
-import pickle
+import random
+import re
 from pathlib import Path
 import config
 from utils.data_models import MemberProfile
+from utils.json_io import list_json_files, read_json, read_json_files
 from utils.table_generator import TableGenerator
 
 
+# Characters not allowed in generated sheet names (letters, digits, space, '-', '_' are kept)
+_RE_SHEET_NAME_STRIP = re.compile(r'[^\w \-]')
+
+
 class GoogleSheetsManager:
     """Manager for Google Sheets operations"""
     
     SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
     
+    # (creds, service) shared by all managers in the process: token.json is read
+    # and the API client is built once per run, not once per command step
+    _cached_auth: Optional[Tuple[Any, Any]] = None
+    
     def __init__(self):
+        # Authentication is deferred until the first API call (see service)
         self.creds = None
-        self.service = None
-        self._authenticate()
+    
+    @cached_property
+    def service(self):
+        """Sheets API client, authenticated on first access (None if no credentials)"""
+        if GoogleSheetsManager._cached_auth is not None:
+            self.creds, service = GoogleSheetsManager._cached_auth
+            return service
+        
+        service = self._authenticate()
+        if service:
+            GoogleSheetsManager._cached_auth = (self.creds, service)
+        return service
     
     def _authenticate(self):
-        """Authenticate with Google Sheets API"""
+        """Authenticate with Google Sheets API and build the client"""
+        # google-auth and the API client are imported here: commands that never
+        # touch Sheets don't pay for these imports
+        from google.oauth2 import service_account
+        from google.oauth2.credentials import Credentials
+        from google.auth.transport.requests import Request
+        from googleapiclient.discovery import build
+        
+        # Try to load existing token (JSON format of google-auth, no pickle deserialization)
+        token_path = Path("token.json")
+        legacy_token_path = Path("token.pickle")
         
-        # Try to load existing token
-        token_path = Path("token.pickle")
+        if not token_path.exists() and legacy_token_path.exists():
+            # One-time migration of a token saved by older versions: convert to JSON
+            # and drop the pickle, so existing installs don't have to re-run the OAuth flow
+            import pickle
+            with open(legacy_token_path, 'rb') as token:
+                legacy_creds = pickle.load(token)
+            token_path.write_text(legacy_creds.to_json(), encoding='utf-8')
+            legacy_token_path.unlink()
+            print("Migrated token.pickle to token.json")
         
         if token_path.exists():
-            with open(token_path, 'rb') as token:
-                self.creds = pickle.load(token)
+            self.creds = Credentials.from_authorized_user_file(str(token_path), self.SCOPES)
         
         # If there are no (valid) credentials available, authenticate
         if not self.creds or not self.creds.valid:
@@ -43,8 +75,7 @@ class GoogleSheetsManager:
                 if config.GOOGLE_SHEETS_CREDENTIALS_PATH:
                     # Check if it's a service account or OAuth2 credentials
                     if config.GOOGLE_SHEETS_CREDENTIALS_PATH.endswith('.json'):
-                        with open(config.GOOGLE_SHEETS_CREDENTIALS_PATH, 'r') as f:
-                            cred_data = json.load(f)
+                        cred_data = read_json(config.GOOGLE_SHEETS_CREDENTIALS_PATH)
                             
                         if 'type' in cred_data and cred_data['type'] == 'service_account':
                             # Service account credentials
@@ -53,19 +84,22 @@ class GoogleSheetsManager:
                                 scopes=self.SCOPES
                             )
                         else:
-                            # OAuth2 credentials
+                            # OAuth2 credentials (imported lazily - only this branch needs the OAuth flow)
+                            from google_auth_oauthlib.flow import InstalledAppFlow
                             flow = InstalledAppFlow.from_client_secrets_file(
                                 config.GOOGLE_SHEETS_CREDENTIALS_PATH, self.SCOPES
                             )
                             self.creds = flow.run_local_server(port=0)
                     
                     # Save the credentials for the next run
-                    if not isinstance(self.creds, service_account.Credentials):
-                        with open(token_path, 'wb') as token:
-                            pickle.dump(self.creds, token)
+                    if self.creds and not isinstance(self.creds, service_account.Credentials):
+                        token_path.write_text(self.creds.to_json(), encoding='utf-8')
         
         if self.creds:
-            self.service = build('sheets', 'v4', credentials=self.creds)
+            # Discovery document is bundled with google-api-python-client (static discovery),
+            # so no network fetch and no discovery file cache is needed
+            return build('sheets', 'v4', credentials=self.creds, cache_discovery=False)
+        return None
     
     def create_spreadsheet(self, title: str) -> str:
         """Create a new spreadsheet"""
@@ -111,44 +145,68 @@ class GoogleSheetsManager:
         
         try:
             # Prepare data
-            values = [config.SHEETS_COLUMNS]  # Header row
-            
-            for profile in profiles:
-                values.append(profile.to_sheets_row())  # Empty reasoning for master sheet
-            
-            body = {
-                'values': values
-            }
+            values = [config.SHEETS_COLUMNS, *(profile.to_sheets_row() for profile in profiles)]
             
-            # Clear existing content and update
-            # Calculate range based on actual data size and columns count
+            # One write request instead of clear + update. Only the data columns (A:J) are
+            # touched: the grid is grown if the data needs more rows/columns but never shrunk,
+            # so columns and notes the users keep next to the data survive the sync
             num_cols = len(config.SHEETS_COLUMNS)
             num_rows = len(values)
-            end_col = chr(ord('A') + num_cols - 1)  # Convert number to column letter
-            range_name = f'A1:{end_col}{num_rows + 100}'  # Add buffer rows for safety
+            properties = self._first_sheet_properties(spreadsheet_id)
+            sheet_id = properties['sheetId']
+            grid = properties.get('gridProperties', {})
+            row_count = grid.get('rowCount', 0)
+            col_count = grid.get('columnCount', 0)
             
-            # Clear first
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=spreadsheet_id,
-                range=range_name
-            ).execute()
+            requests = []
+            if num_rows > row_count or num_cols > col_count:
+                requests.append({
+                    'updateSheetProperties': {
+                        'properties': {
+                            'sheetId': sheet_id,
+                            'gridProperties': {
+                                'rowCount': max(num_rows, row_count),
+                                'columnCount': max(num_cols, col_count)
+                            }
+                        },
+                        'fields': 'gridProperties(rowCount,columnCount)'
+                    }
+                })
+            # The range spans all existing rows: data columns of rows below the data
+            # (left over from a larger previous sync) are not covered by `rows` and get cleared
+            requests.append({
+                'updateCells': {
+                    'range': {
+                        'sheetId': sheet_id,
+                        'startRowIndex': 0,
+                        'endRowIndex': max(num_rows, row_count),
+                        'startColumnIndex': 0,
+                        'endColumnIndex': num_cols
+                    },
+                    'rows': self._to_row_data(values),
+                    'fields': 'userEnteredValue'
+                }
+            })
             
-            # Then update
-            result = self.service.spreadsheets().values().update(
+            self.service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                body=body
+                body={'requests': requests}
             ).execute()
             
-            print(f"Updated {result.get('updatedCells')} cells in master spreadsheet")
+            print(f"Updated {num_rows * num_cols} cells in master spreadsheet")
             return True
             
         except HttpError as error:
             print(f"An error occurred: {error}")
             return False
     
-    def create_analysis_sheet(self, analysis_results: List, criteria: str, mode: str = "professional") -> Optional[str]:
+    def create_analysis_sheet(
+        self,
+        analysis_results: List,
+        criteria: str,
+        mode: str = "professional",
+        scores_tail: Optional[List[Tuple[str, float]]] = None
+    ) -> Optional[str]:
         """Add a new sheet with analysis results to master spreadsheet using unified table generator"""
         if not self.service:
             print("Google Sheets not authenticated. Skipping sheets creation.")
@@ -162,64 +220,97 @@ class GoogleSheetsManager:
             
         # Create sheet name
         timestamp = datetime.now().strftime("%m-%d %H:%M")
-        safe_criteria = "".join(c for c in criteria if c.isalnum() or c in (' ', '-', '_'))[:20]
+        safe_criteria = _RE_SHEET_NAME_STRIP.sub('', criteria)[:20]
         safe_criteria = safe_criteria.replace(' ', '_')
         sheet_name = f"Анализ_{safe_criteria}_{timestamp}"
         
         try:
-            # First, create a new sheet in the existing spreadsheet
-            requests = [{
-                'addSheet': {
-                    'properties': {
-                        'title': sheet_name
-                    }
-                }
-            }]
-            
-            # Create the new sheet
-            self.service.spreadsheets().batchUpdate(
-                spreadsheetId=spreadsheet_id,
-                body={'requests': requests}
-            ).execute()
-            
             # Use TableGenerator to prepare data
             values = TableGenerator.prepare_sheets_data(
                 analysis_results=analysis_results,
                 criteria=criteria,
                 mode=mode,
-                include_all_profiles=True  # Включаем все профили
+                include_all_profiles=True,  # Включаем все профили
+                scores_tail=scores_tail
             )
             
-            # Update the new sheet with data
-            body = {'values': values}
-            self.service.spreadsheets().values().update(
+            # Create the sheet and fill it in one batchUpdate: the sheetId is chosen here,
+            # so the data request can reference the sheet before it exists
+            sheet_id = random.randrange(1, 2 ** 31)
+            requests = [
+                {
+                    'addSheet': {
+                        'properties': {
+                            'sheetId': sheet_id,
+                            'title': sheet_name,
+                            'gridProperties': {
+                                'rowCount': max(len(values), 1),
+                                'columnCount': max((len(row) for row in values), default=1)
+                            }
+                        }
+                    }
+                },
+                {
+                    'updateCells': {
+                        'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+                        'rows': self._to_row_data(values),
+                        'fields': 'userEnteredValue'
+                    }
+                }
+            ]
+            
+            self.service.spreadsheets().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                range=f'{sheet_name}!A1',  # Write to the new sheet
-                valueInputOption='RAW',
-                body=body
+                body={'requests': requests}
             ).execute()
             
             print(f"Created analysis sheet: {sheet_name}")
-            print(f"Spreadsheet URL: https://docs.google.com/spreadsheets/d/{spreadsheet_id}#gid=0")
+            print(f"Spreadsheet URL: https://docs.google.com/spreadsheets/d/{spreadsheet_id}#gid={sheet_id}")
             return spreadsheet_id
             
         except HttpError as error:
             print(f"An error occurred: {error}")
             return None
     
+    def _first_sheet_properties(self, spreadsheet_id: str) -> Dict[str, Any]:
+        """sheetId and current grid size of the first sheet (reads don't count against the write quota)"""
+        spreadsheet = self.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties(sheetId,gridProperties(rowCount,columnCount))'
+        ).execute()
+        return spreadsheet['sheets'][0]['properties']
+    
+    @staticmethod
+    def _to_row_data(values: List[List[Any]]) -> List[Dict[str, Any]]:
+        """Rows of plain values -> RowData for updateCells (same as valueInputOption RAW)"""
+        rows = []
+        for row in values:
+            cells = []
+            for value in row:
+                if value is None or value == '':
+                    cells.append({})
+                elif isinstance(value, bool):
+                    cells.append({'userEnteredValue': {'boolValue': value}})
+                elif isinstance(value, (int, float)):
+                    cells.append({'userEnteredValue': {'numberValue': value}})
+                else:
+                    cells.append({'userEnteredValue': {'stringValue': str(value)}})
+            rows.append({'values': cells})
+        return rows
+    
     def load_all_profiles_from_disk(self) -> List[MemberProfile]:
         """Load all profiles from JSON files"""
         profiles = []
-        json_files = list(config.PROFILES_DIR.glob("*.json"))
         
-        for json_file in json_files:
+        # Files are read in a thread pool. Profiles on disk were validated when extracted,
+        # so the models are built with model_construct (no re-validation)
+        for json_file, profile_data in read_json_files(list_json_files(config.PROFILES_DIR)):
             try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    profile_data = json.load(f)
-                    profile = MemberProfile(**profile_data)
-                    profiles.append(profile)
+                if isinstance(profile_data, Exception):
+                    raise profile_data
+                profiles.append(MemberProfile.model_construct(**profile_data))
             except Exception as e:
-                print(f"Error loading profile from {json_file}: {str(e)}")
+                print(f"Error loading profile from {json_file.path}: {str(e)}")
         
         return profiles
     
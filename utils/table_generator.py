@@ -1,20 +1,51 @@
 import csv
+import io
 import tempfile
-from typing import List, Dict, Tuple, Optional
-from datetime import datetime
-from pathlib import Path
-import json
-import sys
+import time
+from operator import attrgetter
+from typing import List, Dict, Sequence, Tuple, Optional
 
-parent_dir = Path(__file__).parent.parent
-if str(parent_dir) not in sys.path:
-    sys.path.insert(0, str(parent_dir))
-
-from utils.data_models import MemberProfile, AnalysisResult
+from utils.data_models import AnalysisResult
 from utils.profile_loader import ProfileLoader
 import config
 
 
+# Размер буфера записи CSV файла
+CSV_BUFFER_SIZE = 1 << 20
+
+# Заголовки таблицы по режиму
+_PROFESSIONAL_HEADERS = (
+    '№',
+    'ФИО',
+    'Экспертиза',
+    'Бизнес',
+    'Хобби',
+    'Семейное положение',
+    'Контакты',
+    'Обоснование',
+    'Косинусная близость',
+    'Соответствие'
+)
+_PERSONAL_HEADERS = (
+    '№',
+    'ФИО',
+    'Хобби',
+    'Семейное положение',
+    'Контакты',
+    'Обоснование',
+    'Косинусная близость',
+    'Соответствие'
+)
+
+# Поля профиля в начале строки таблицы (после номера), по режиму
+_PROFESSIONAL_FIELDS = attrgetter('name', 'expertise', 'business')
+
+
+def _personal_fields(profile) -> Tuple[str]:
+    """Поля начала строки в персональном режиме (attrgetter с одним полем вернул бы не кортеж)"""
+    return (profile.name,)
+
+
 class TableGenerator:
     """Единый генератор таблиц для CSV и Google Sheets"""
     
@@ -23,8 +54,9 @@ class TableGenerator:
         analysis_results: List[AnalysisResult],
         criteria: str,
         mode: str,
-        include_all_profiles: bool = True
-    ) -> Tuple[List[List[str]], Dict[str, any]]:
+        include_all_profiles: bool = True,
+        scores_tail: Optional[List[Tuple[str, float]]] = None
+    ) -> Tuple[List[Tuple[str, ...]], Dict[str, any]]:
         """
         Подготавливает данные для таблицы
         
@@ -33,33 +65,35 @@ class TableGenerator:
             criteria: Критерий поиска
             mode: Режим поиска (professional/personal)
             include_all_profiles: Включать ли все профили или только подходящие
+            scores_tail: Профили без LLM анализа - пары (имя, similarity_score)
             
         Returns:
             Tuple[rows, metadata] - строки таблицы и метаданные
         """
+        scores_tail = scores_tail or []
         
-        # Сортируем результаты:
+        # Строки таблицы: (имя, соответствие, обоснование, similarity_score)
         # 1. Сначала подходящие (matches=True) по similarity_score
-        # 2. Затем остальные по similarity_score
-        matched = [r for r in analysis_results if r.matches]
-        unmatched = [r for r in analysis_results if not r.matches]
-        
-        # Сортируем каждую группу по similarity_score (убывание)
-        matched.sort(key=lambda x: x.similarity_score, reverse=True)
-        unmatched.sort(key=lambda x: x.similarity_score, reverse=True)
-        
-        # Объединяем в финальный список
+        # 2. Затем остальные (включая профили без LLM анализа) по similarity_score
+        entries = [(r.profile_name, bool(r.matches), r.reasoning, r.similarity_score) for r in analysis_results]
+        matched_count = sum(1 for entry in entries if entry[1])
         if include_all_profiles:
-            sorted_results = matched + unmatched
+            entries.extend((name, False, '', score) for name, score in scores_tail)
         else:
-            sorted_results = matched
+            entries = [entry for entry in entries if entry[1]]
         
-        # Загружаем полные профили
-        profiles_with_results = []
-        for result in sorted_results:
-            profile = TableGenerator._load_profile(result.profile_name)
-            if profile:
-                profiles_with_results.append((profile, result))
+        # Одна сортировка вместо двух групп и конкатенации: ключ (не подходит, -similarity_score)
+        sorted_entries = sorted(entries, key=lambda x: (not x[1], -x[3]))
+        
+        # Профили, уже приложенные к результатам анализа, не загружаем повторно;
+        # остальные - одним обращением к снимку профилей
+        profiles = {r.profile_name: r.profile for r in analysis_results if r.profile is not None}
+        profiles.update(ProfileLoader.load_many(
+            entry[0] for entry in sorted_entries if entry[0] not in profiles
+        ))
+        profiles_with_results = [
+            (profiles[entry[0]], entry) for entry in sorted_entries if entry[0] in profiles
+        ]
         
         # Создаем метаданные
         # Подсчитываем сколько профилей было проанализировано через AI (те у которых есть reasoning)
@@ -68,69 +102,31 @@ class TableGenerator:
         metadata = {
             'criteria': criteria,
             'mode': 'Профессиональный' if mode == 'professional' else 'Персональный',
-            'analysis_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'total_profiles': len(analysis_results),
-            'matched_profiles': len(matched),
+            'analysis_date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'total_profiles': len(analysis_results) + len(scores_tail),
+            'matched_profiles': matched_count,
             'top_analyzed': analyzed_count  # Количество профилей, проанализированных через LLM
         }
         
-        # Формируем строки таблицы
-        rows = []
-        
-        # Заголовок зависит от режима
-        if mode == 'professional':
-            headers = [
-                '№',
-                'ФИО',
-                'Экспертиза', 
-                'Бизнес',
-                'Хобби',
-                'Семейное положение',
-                'Контакты',
-                'Обоснование',
-                'Косинусная близость',
-                'Соответствие'
-            ]
-        else:  # personal mode
-            headers = [
-                '№',
-                'ФИО',
-                'Хобби',
-                'Семейное положение',
-                'Контакты',
-                'Обоснование',
-                'Косинусная близость',
-                'Соответствие'
-            ]
-        rows.append(headers)
-        
-        # Данные
-        for i, (profile, result) in enumerate(profiles_with_results, 1):
-            if mode == 'professional':
-                row = [
-                    str(i),
-                    profile.name,
-                    profile.expertise,
-                    profile.business,
-                    ', '.join(profile.hobbies) if profile.hobbies else '',
-                    profile.family_status or '',
-                    ', '.join(profile.contacts) if profile.contacts else '',
-                    result.reasoning if result.reasoning else '',
-                    f"{result.similarity_score:.3f}" if result.similarity_score else '',
-                    '✓' if result.matches else ''
-                ]
-            else:  # personal mode
-                row = [
-                    str(i),
-                    profile.name,
-                    ', '.join(profile.hobbies) if profile.hobbies else '',
-                    profile.family_status or '',
-                    ', '.join(profile.contacts) if profile.contacts else '',
-                    result.reasoning if result.reasoning else '',
-                    f"{result.similarity_score:.3f}" if result.similarity_score else '',
-                    '✓' if result.matches else ''
-                ]
-            rows.append(row)
+        # Формируем строки таблицы: заголовок зависит от режима
+        # Строки - кортежи: дешевле списков, а csv.writer и Sheets принимают любую последовательность
+        rows = [_PROFESSIONAL_HEADERS if mode == 'professional' else _PERSONAL_HEADERS]
+        
+        # Данные: поля, зависящие от режима, читаются одним attrgetter на строку
+        leading_fields = _PROFESSIONAL_FIELDS if mode == 'professional' else _personal_fields
+        rows.extend(
+            (
+                str(i),
+                *leading_fields(profile),
+                ', '.join(profile.hobbies) if profile.hobbies else '',
+                profile.family_status or '',
+                ', '.join(profile.contacts) if profile.contacts else '',
+                reasoning or '',
+                f"{similarity_score:.3f}" if similarity_score else '',
+                '✓' if matches else ''
+            )
+            for i, (profile, (_, matches, reasoning, similarity_score)) in enumerate(profiles_with_results, 1)
+        )
         
         return rows, metadata
     
@@ -139,7 +135,8 @@ class TableGenerator:
         analysis_results: List[AnalysisResult],
         criteria: str,
         mode: str,
-        include_all_profiles: bool = True
+        include_all_profiles: bool = True,
+        scores_tail: Optional[List[Tuple[str, float]]] = None
     ) -> str:
         """
         Генерирует CSV файл с результатами
@@ -148,40 +145,67 @@ class TableGenerator:
             Путь к созданному CSV файлу
         """
         rows, metadata = TableGenerator.prepare_table_data(
-            analysis_results, criteria, mode, include_all_profiles
+            analysis_results, criteria, mode, include_all_profiles, scores_tail
         )
         
-        # Создаем временный файл
+        # Создаем временный файл; буфер 1 МБ - строки уходят на диск крупными блоками,
+        # а не отдельным write() на каждые 8 КБ
         with tempfile.NamedTemporaryFile(
             mode='w', 
             delete=False, 
             suffix='.csv', 
-            encoding='utf-8-sig'
+            encoding='utf-8-sig',
+            newline='',
+            buffering=CSV_BUFFER_SIZE
         ) as f:
-            writer = csv.writer(f)
-            
-            # Записываем метаданные
-            writer.writerow(['Критерий поиска:', metadata['criteria']])
-            writer.writerow(['Режим:', metadata['mode']])
-            writer.writerow(['Дата анализа:', metadata['analysis_date']])
-            writer.writerow(['Всего профилей:', metadata['total_profiles']])
-            writer.writerow(['Найдено соответствий:', metadata['matched_profiles']])
-            writer.writerow(['Проанализировано через AI:', metadata['top_analyzed']])
-            writer.writerow([])  # Пустая строка
-            
-            # Записываем таблицу
-            for row in rows:
-                writer.writerow(row)
-            
+            TableGenerator._write_csv(f, rows, metadata)
             return f.name
     
+    @staticmethod
+    def generate_csv_bytes(
+        analysis_results: List[AnalysisResult],
+        criteria: str,
+        mode: str,
+        include_all_profiles: bool = True,
+        scores_tail: Optional[List[Tuple[str, float]]] = None
+    ) -> bytes:
+        """
+        Генерирует CSV в памяти (для отправки без временного файла на диске)
+        
+        Returns:
+            Содержимое CSV в кодировке utf-8-sig
+        """
+        rows, metadata = TableGenerator.prepare_table_data(
+            analysis_results, criteria, mode, include_all_profiles, scores_tail
+        )
+        
+        buffer = io.StringIO(newline='')
+        TableGenerator._write_csv(buffer, rows, metadata)
+        return buffer.getvalue().encode('utf-8-sig')
+    
+    @staticmethod
+    def _write_csv(f, rows: List[Sequence[str]], metadata: Dict) -> None:
+        """Записывает метаданные и таблицу в открытый текстовый поток"""
+        # Метаданные, пустая строка и таблица - одним вызовом writerows
+        csv.writer(f).writerows([
+            ['Критерий поиска:', metadata['criteria']],
+            ['Режим:', metadata['mode']],
+            ['Дата анализа:', metadata['analysis_date']],
+            ['Всего профилей:', metadata['total_profiles']],
+            ['Найдено соответствий:', metadata['matched_profiles']],
+            ['Проанализировано через AI:', metadata['top_analyzed']],
+            [],  # Пустая строка
+            *rows
+        ])
+    
     @staticmethod
     def prepare_sheets_data(
         analysis_results: List[AnalysisResult],
         criteria: str,
         mode: str,
-        include_all_profiles: bool = True
-    ) -> List[List[str]]:
+        include_all_profiles: bool = True,
+        scores_tail: Optional[List[Tuple[str, float]]] = None
+    ) -> List[Sequence[str]]:
         """
         Подготавливает данные для Google Sheets
         
@@ -189,27 +213,17 @@ class TableGenerator:
             Список строк для записи в Google Sheets
         """
         rows, metadata = TableGenerator.prepare_table_data(
-            analysis_results, criteria, mode, include_all_profiles
+            analysis_results, criteria, mode, include_all_profiles, scores_tail
         )
         
-        # Для Google Sheets добавляем метаданные в начало
-        sheets_data = []
-        
-        # Метаданные
-        sheets_data.append(['Критерий поиска:', metadata['criteria']])
-        sheets_data.append(['Режим:', metadata['mode']])
-        sheets_data.append(['Дата анализа:', metadata['analysis_date']])
-        sheets_data.append(['Всего профилей:', str(metadata['total_profiles'])])
-        sheets_data.append(['Найдено соответствий:', str(metadata['matched_profiles'])])
-        sheets_data.append(['Проанализировано через AI:', str(metadata['top_analyzed'])])
-        sheets_data.append([])  # Пустая строка
-        
-        # Добавляем основные данные
-        sheets_data.extend(rows)
-        
-        return sheets_data
-    
-    @staticmethod
-    def _load_profile(name: str) -> Optional[MemberProfile]:
-        """Загружает профиль по имени"""
-        return ProfileLoader.load_by_name(name)
\ No newline at end of file
+        # Для Google Sheets добавляем метаданные в начало, затем основные данные
+        return [
+            ['Критерий поиска:', metadata['criteria']],
+            ['Режим:', metadata['mode']],
+            ['Дата анализа:', metadata['analysis_date']],
+            ['Всего профилей:', str(metadata['total_profiles'])],
+            ['Найдено соответствий:', str(metadata['matched_profiles'])],
+            ['Проанализировано через AI:', str(metadata['top_analyzed'])],
+            [],  # Пустая строка
+            *rows
+        ]
@@ -1,16 +1,21 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List, Optional, TypedDict
-import json
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 from agents.image_analyzer import ImageAnalyzerAgent
 from agents.text_analyzer import TextAnalyzerAgent
-from agents.embedding_agent import EmbeddingAgent
+from utils.console import collect_output
 from utils.data_models import WorkflowState, MemberProfile, AnalysisRequest
 from utils.profile_loader import ProfileLoader
 import config
 from pathlib import Path
 
 
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+# Batch progress line is printed every N processed images
+PROGRESS_EVERY = 10
+
+
 class ProfileWorkflowState(TypedDict):
     """State for the profile processing workflow"""
     image_path: Optional[str]
@@ -25,9 +30,13 @@ class ProfileWorkflowState(TypedDict):
 class ProfileProcessingWorkflow:
     """Main workflow for processing YARD Business Club profiles"""
     
-    def __init__(self):
-        self.image_analyzer = ImageAnalyzerAgent()
+    def __init__(self, use_cache: bool = True):
+        # use_cache=False: re-extract images that were already processed (extract --no-cache)
+        self.image_analyzer = ImageAnalyzerAgent(use_cache=use_cache)
         self.text_analyzer = TextAnalyzerAgent()
+        # One embedding client (OpenAI + ChromaDB) for the whole batch - the text analyzer's one is reused.
+        # Its Chroma writes are serialized internally; embedding requests of parallel workers overlap
+        self.embedding_agent = self.text_analyzer.embedding_agent
         self.workflow = self._build_workflow()
         
     def _build_workflow(self) -> StateGraph:
@@ -84,68 +93,90 @@ class ProfileProcessingWorkflow:
         }
         
         result = self.workflow.invoke(initial_state)
+        self.image_analyzer.flush()
         return result
     
+    def process_single_image_fast(self, image_path: str, analysis_request: Optional[AnalysisRequest] = None) -> Dict[str, Any]:
+        """Same flow as process_single_image, run directly without the LangGraph engine (batch hot path)"""
+        state = {
+            "image_path": image_path,
+            "analysis_request": analysis_request.model_dump() if analysis_request else None
+        }
+        
+        state.update(self._analyze_image_node(state))
+        if self._should_analyze_text(state) == "analyze":
+            state.update(self._analyze_text_node(state))
+        return state
+    
     def process_batch_images(self, image_paths: List[str]) -> List[Dict[str, Any]]:
-        """Process multiple images"""
-        results = []
-        
-        for image_path in image_paths:
-            print(f"\nProcessing: {image_path}", flush=True)
-            try:
-                result = self.process_single_image(image_path)
-                results.append(result)
-                
-                if result.get("error"):
-                    print(f"  Error: {result['error']}", flush=True)
-                else:
-                    profile = result.get("profile")
-                    if profile:
-                        # Проверяем, был ли профиль загружен из кэша или создан заново
-                        if result.get("was_cached"):
-                            print(f"  ✓ Using existing profile for: {profile.get('name', 'Unknown')}", flush=True)
-                            print(f"  ✓ Already indexed in embeddings", flush=True)
-                        else:
-                            print(f"  ✓ Extracted profile for: {profile.get('name', 'Unknown')}", flush=True)
-                            
-                            # Index profile for embedding search only for new profiles
-                            try:
-                                embedding_agent = EmbeddingAgent()
-                                profile_obj = MemberProfile(**profile)
-                                embedding_agent.index_profile(profile_obj)
-                                print(f"  ✓ Indexed for embedding search", flush=True)
-                            except Exception as e:
-                                print(f"  ⚠ Could not index for embeddings: {str(e)}", flush=True)
-            except Exception as e:
-                print(f"  ✗ Failed to process: {str(e)}", flush=True)
-                results.append({"image_path": image_path, "error": str(e)})
-        
-        return results
+        """Process multiple images (concurrently - each image is mostly waiting on the LLM API)"""
+        total = len(image_paths)
+        with ThreadPoolExecutor(max_workers=config.BATCH_CONCURRENCY) as executor:
+            futures = [executor.submit(self._process_and_index, image_path) for image_path in image_paths]
+            # Per-image lines are buffered; only the periodic heartbeat forces a flush
+            for done, _ in enumerate(as_completed(futures), 1):
+                if done % PROGRESS_EVERY == 0 or done == total:
+                    print(f"Processed {done}/{total}", flush=True)
+        self.image_analyzer.flush()
+        return [future.result() for future in futures]
+    
+    def _process_and_index(self, image_path: str) -> Dict[str, Any]:
+        """Process one image of a batch and index a newly extracted profile for embedding search"""
+        # Lines are printed together when the image is done, so output of parallel images doesn't interleave;
+        # messages of the image analyzer and embedding agent for this image land in the same block
+        log = [f"\nProcessing: {image_path}"]
+        try:
+            with collect_output(log, indent="  "):
+                result = self.process_single_image_fast(image_path)
+            
+            if result.get("error"):
+                log.append(f"  Error: {result['error']}")
+            else:
+                profile = result.get("profile")
+                if profile:
+                    # Проверяем, был ли профиль загружен из кэша или создан заново
+                    if result.get("was_cached"):
+                        log.append(f"  ✓ Using existing profile for: {profile.get('name', 'Unknown')}")
+                        log.append(f"  ✓ Already indexed in embeddings")
+                    else:
+                        log.append(f"  ✓ Extracted profile for: {profile.get('name', 'Unknown')}")
+                        
+                        # Index profile for embedding search only for new profiles
+                        try:
+                            profile_obj = MemberProfile(**profile)
+                            with collect_output(log, indent="  "):
+                                self.embedding_agent.index_profile(profile_obj)
+                            log.append(f"  ✓ Indexed for embedding search")
+                        except Exception as e:
+                            log.append(f"  ⚠ Could not index for embeddings: {str(e)}")
+        except Exception as e:
+            log.append(f"  ✗ Failed to process: {str(e)}")
+            result = {"image_path": image_path, "error": str(e)}
+        
+        print("\n".join(log))
+        return result
     
 
 
 class BatchProcessingWorkflow:
     """Workflow for batch processing of images"""
     
-    def __init__(self):
-        self.profile_workflow = ProfileProcessingWorkflow()
+    def __init__(self, use_cache: bool = True):
+        self.profile_workflow = ProfileProcessingWorkflow(use_cache=use_cache)
     
     def discover_images(self, directory: Path = None) -> List[str]:
         """Discover all images in the specified directory"""
         if directory is None:
             directory = config.PHOTOS_DIR
         
-        image_extensions = ['.jpg', '.jpeg', '.png', '.webp', '.bmp']
-        image_files = []
-        
-        for ext in image_extensions:
-            image_files.extend(directory.glob(f"*{ext}"))
-            image_files.extend(directory.glob(f"*{ext.upper()}"))
-        
-        # Filter out thumbnails
-        image_files = [f for f in image_files if 'thumb' not in f.name.lower()]
-        
-        return [str(f) for f in image_files]
+        # One directory pass; extension match is case-insensitive, thumbnails are skipped
+        with os.scandir(directory) as entries:
+            return [
+                entry.path for entry in entries
+                if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+                and 'thumb' not in entry.name.lower()
+                and entry.is_file()
+            ]
     
     def process_all_images(self, directory: Path = None) -> Dict[str, Any]:
         """Process all images in directory"""